@@ -183,11 +183,12 @@ class GoogleImagenAdapter(ImageGeneratorAdapter):
         draw = ImageDraw.Draw(img)
 
         # Gradient background (Google colors)
+        inv_h = 1.0 / request.height
+        row_end = request.width
+        line = draw.line
         for y in range(request.height):
-            r = int(66 + (y / request.height) * 50)
-            g = int(133 + (y / request.height) * 30)
-            b = int(244 - (y / request.height) * 40)
-            draw.line([(0, y), (request.width, y)], fill=(r, g, b))
+            t = y * inv_h
+            line([(0, y), (row_end, y)], fill=(int(66 + t * 50), int(133 + t * 30), int(244 - t * 40)))
 
         # Placeholder silhouette
         cx, cy = request.width // 2, request.height // 2
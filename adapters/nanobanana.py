@@ -2,20 +2,134 @@
 Nano Banana Image Generation Adapter.
 
 This module provides an interface to the Nano Banana image generation model.
-Currently implements a placeholder/dry-run mode that generates debug images.
-Replace the placeholder implementation with real API calls when available.
+Without an API key it runs in placeholder/dry-run mode and generates debug images.
 """
 
+import base64
+import functools
 import logging
 import os
+import threading
+import weakref
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from io import BytesIO
 from typing import Optional
 
+import numpy as np
+import requests
 from PIL import Image, ImageDraw, ImageFont
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Reference images are downscaled before upload to stay under the API size cap
+REFERENCE_MAX_EDGE = 1024
+REFERENCE_MAX_BYTES = 4 * 1024 * 1024
+
+# Shared HTTP session so API calls reuse pooled TLS connections
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+
+# Reusable gradient buffers keyed by (height, width). Image.fromarray copies RGB
+# data out of the buffer, so one buffer per size can be refilled for every call.
+_BUF_POOL: dict[tuple[int, int], np.ndarray] = {}
+_BUF_POOL_LOCK = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Get the shared API session, retrying rate limits and transient 5xx errors."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            retry = Retry(
+                total=5,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["POST"],
+            )
+            session = requests.Session()
+            session.mount(
+                "https://",
+                HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=retry),
+            )
+            _SESSION = session
+        return _SESSION
+
+
+@functools.lru_cache(maxsize=4)
+def _load_font(size: int) -> ImageFont.ImageFont:
+    """Load the placeholder font once per size, falling back to Pillow's default."""
+    try:
+        return ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", size)
+    except (OSError, IOError):
+        try:
+            return ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", size)
+        except (OSError, IOError):
+            return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=1024)
+def _glyph(size: int, char: str) -> tuple[Optional[Image.Image], float]:
+    """
+    Rasterize a single character once and return (mask, advance width).
+
+    The mask is positioned as draw.text((0, 0), char) would place it, so it can
+    be pasted at the pen position directly. Blank glyphs return a None mask.
+    """
+    font = _load_font(size)
+    advance = font.getlength(char)
+    _, _, right, bottom = font.getbbox(char)
+    if right <= 0 or bottom <= 0 or char.isspace():
+        return None, advance
+
+    mask = Image.new("L", (right, bottom), 0)
+    ImageDraw.Draw(mask).text((0, 0), char, font=font, fill=255)
+    return mask, advance
+
+
+@functools.lru_cache(maxsize=16)
+def _silhouette_template(width: int, height: int) -> Image.Image:
+    """Render the placeholder figure silhouette onto a transparent RGBA canvas."""
+    template = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(template)
+
+    center_x = width // 2
+    center_y = height // 2
+
+    # Draw a simple figure silhouette
+    head_radius = min(width, height) // 10
+    body_width = head_radius * 2
+    body_height = head_radius * 4
+
+    # Head
+    draw.ellipse(
+        [
+            center_x - head_radius,
+            center_y - body_height // 2 - head_radius,
+            center_x + head_radius,
+            center_y - body_height // 2 + head_radius,
+        ],
+        fill=(200, 200, 220, 255),
+        outline=(150, 150, 170, 255),
+    )
+
+    # Body
+    draw.rounded_rectangle(
+        [
+            center_x - body_width // 2,
+            center_y - body_height // 2 + head_radius,
+            center_x + body_width // 2,
+            center_y + body_height // 2,
+        ],
+        radius=10,
+        fill=(180, 180, 200, 255),
+        outline=(150, 150, 170, 255),
+    )
+
+    return template
+
 
 @dataclass
 class GenerationRequest:
@@ -60,11 +174,8 @@ class NanoBananaAdapter(ImageGeneratorAdapter):
     """
     Adapter for the Nano Banana image generation model.
 
-    TODO: Replace placeholder implementation with real API calls:
-    1. Set NANOBANANA_API_KEY environment variable
-    2. Implement _call_api() method with actual API endpoint
-    3. Handle image upload for reference images
-    4. Parse API response and extract generated image
+    Set NANOBANANA_API_KEY (and optionally NANOBANANA_API_ENDPOINT) to enable
+    real API calls; otherwise placeholder images are generated.
     """
 
     def __init__(self, api_key: Optional[str] = None, dry_run: bool = False):
@@ -77,6 +188,10 @@ class NanoBananaAdapter(ImageGeneratorAdapter):
         """
         self.api_key = api_key or os.environ.get("NANOBANANA_API_KEY")
         self.dry_run = dry_run
+        # Encoded reference images keyed by id(), so a shared anchor image is
+        # only downscaled and base64-encoded once across panels
+        self._reference_cache: dict[int, tuple[weakref.ref, str]] = {}
+        self._reference_cache_lock = threading.Lock()
         self.api_endpoint = os.environ.get(
             "NANOBANANA_API_ENDPOINT",
             "https://api.nanobanana.ai/v1/generate"  # Placeholder URL
@@ -106,7 +221,6 @@ class NanoBananaAdapter(ImageGeneratorAdapter):
             logger.info("Using placeholder generation (dry-run mode)")
             return self._generate_placeholder(request)
 
-        # TODO: Implement real API call
         return self._call_api(request)
 
     def _generate_placeholder(self, request: GenerationRequest) -> GenerationResult:
@@ -114,55 +228,27 @@ class NanoBananaAdapter(ImageGeneratorAdapter):
         Generate a placeholder image with the prompt text.
         Useful for debugging prompts without making real API calls.
         """
-        # Create a gradient background
-        img = Image.new("RGB", (request.width, request.height))
+        # Create a nice gradient background (purple to blue), one row colour per y
+        ys = np.arange(request.height, dtype=np.float32) / request.height
+        row_colors = np.stack(
+            [80 + ys * 40, 60 + ys * 80, 120 + ys * 80], axis=1
+        ).astype(np.uint8)
+        shape = (request.height, request.width)
+        with _BUF_POOL_LOCK:
+            buf = _BUF_POOL.get(shape)
+            if buf is None:
+                buf = _BUF_POOL[shape] = np.empty((*shape, 3), dtype=np.uint8)
+            buf[:] = row_colors[:, None, :]
+            img = Image.fromarray(buf, "RGB")
         draw = ImageDraw.Draw(img)
 
-        # Create a nice gradient background
-        for y in range(request.height):
-            # Purple to blue gradient
-            r = int(80 + (y / request.height) * 40)
-            g = int(60 + (y / request.height) * 80)
-            b = int(120 + (y / request.height) * 80)
-            draw.line([(0, y), (request.width, y)], fill=(r, g, b))
-
-        # Add a placeholder character silhouette
-        center_x = request.width // 2
-        center_y = request.height // 2
-
-        # Draw a simple figure silhouette
-        head_radius = min(request.width, request.height) // 10
-        body_width = head_radius * 2
-        body_height = head_radius * 4
-
-        # Head
-        draw.ellipse(
-            [
-                center_x - head_radius,
-                center_y - body_height // 2 - head_radius,
-                center_x + head_radius,
-                center_y - body_height // 2 + head_radius,
-            ],
-            fill=(200, 200, 220),
-            outline=(150, 150, 170),
-        )
-
-        # Body
-        draw.rounded_rectangle(
-            [
-                center_x - body_width // 2,
-                center_y - body_height // 2 + head_radius,
-                center_x + body_width // 2,
-                center_y + body_height // 2,
-            ],
-            radius=10,
-            fill=(180, 180, 200),
-            outline=(150, 150, 170),
-        )
+        # Add a placeholder character silhouette (rendered once per size)
+        silhouette = _silhouette_template(request.width, request.height)
+        img.paste(silhouette, (0, 0), mask=silhouette)
 
         # Add prompt text overlay
         self._draw_text_wrapped(
-            draw,
+            img,
             f"[PLACEHOLDER]\n\n{request.prompt}",
             (10, 10),
             request.width - 20,
@@ -192,91 +278,154 @@ class NanoBananaAdapter(ImageGeneratorAdapter):
 
     def _draw_text_wrapped(
         self,
-        draw: ImageDraw.ImageDraw,
+        img: Image.Image,
         text: str,
         position: tuple[int, int],
         max_width: int,
         fill=(255, 255, 255),
     ):
-        """Draw text with word wrapping."""
-        try:
-            font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", 14)
-        except (OSError, IOError):
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-            except (OSError, IOError):
-                font = ImageFont.load_default()
+        """Draw text with word wrapping, blitting glyphs from the cached atlas."""
+        font_size = 14
+        font = _load_font(font_size)
+
+        # Measure each word once by advance width instead of re-laying out the
+        # whole candidate line for every word.
+        space_width = font.getlength(" ")
 
         lines = []
         for paragraph in text.split("\n"):
             words = paragraph.split()
             current_line = []
+            line_width = 0.0
 
             for word in words:
-                test_line = " ".join(current_line + [word])
-                bbox = draw.textbbox((0, 0), test_line, font=font)
-                if bbox[2] - bbox[0] <= max_width:
+                word_width = font.getlength(word)
+                if not current_line:
+                    candidate_width = word_width
+                else:
+                    candidate_width = line_width + space_width + word_width
+
+                if candidate_width <= max_width:
                     current_line.append(word)
+                    line_width = candidate_width
                 else:
                     if current_line:
                         lines.append(" ".join(current_line))
                     current_line = [word]
+                    line_width = word_width
 
             if current_line:
                 lines.append(" ".join(current_line))
             else:
                 lines.append("")
 
+        # paste() wants a colour with exactly one value per band
+        color = tuple(fill[: len(img.getbands())])
+
         y = position[1]
         for line in lines[:15]:  # Limit to 15 lines
-            draw.text((position[0], y), line, font=font, fill=fill)
+            x = float(position[0])
+            for char in line:
+                mask, advance = _glyph(font_size, char)
+                if mask is not None:
+                    img.paste(color, (round(x), y), mask)
+                x += advance
             y += 18
 
     def _call_api(self, request: GenerationRequest) -> GenerationResult:
         """
         Call the real Nano Banana API.
 
-        TODO: Implement this method with actual API integration:
-
-        1. Prepare the request payload:
-           payload = {
-               "prompt": request.prompt,
-               "negative_prompt": request.negative_prompt,
-               "width": request.width,
-               "height": request.height,
-               "seed": request.seed,
-               "identity_strength": request.identity_strength,
-               "reference_weight": request.reference_weight,
-               "style_preset": request.style_preset,
-           }
-
-        2. Upload/encode reference images:
-           - Convert PIL Images to base64 or upload to temporary storage
-           - Add reference image URLs/data to payload
-
-        3. Make the API call:
-           response = requests.post(
-               self.api_endpoint,
-               headers={"Authorization": f"Bearer {self.api_key}"},
-               json=payload,
-           )
-
-        4. Parse response and return GenerationResult:
-           - Decode generated image from response
-           - Extract metadata (actual seed used, etc.)
-
-        5. Handle errors appropriately:
-           - Rate limiting
-           - Invalid API key
-           - Content policy violations
-           - Network errors
+        Reference images are downscaled and sent inline as base64. The response is expected to
+        carry the generated image as base64 under "image" and the seed actually
+        used under "seed".
+
+        Raises:
+            RuntimeError: If the API rejects the request or returns no image.
         """
-        raise NotImplementedError(
-            "Real Nano Banana API integration not implemented. "
-            "Set dry_run=True or implement _call_api() with actual API calls. "
-            "See TODO comments in this method for implementation guide."
+        payload = {
+            "prompt": request.prompt,
+            "negative_prompt": request.negative_prompt,
+            "width": request.width,
+            "height": request.height,
+            "seed": request.seed,
+            "identity_strength": request.identity_strength,
+            "reference_weight": request.reference_weight,
+            "style_preset": request.style_preset,
+            "reference_images": [
+                self._get_encoded_reference(img) for img in request.reference_images
+            ],
+        }
+
+        try:
+            response = _get_session().post(
+                self.api_endpoint,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json=payload,
+                timeout=120,
+            )
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Nano Banana API request failed: {e}") from e
+
+        if response.status_code in (401, 403):
+            raise RuntimeError("Nano Banana API rejected the API key")
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Nano Banana API error: HTTP {response.status_code}: {response.text[:200]}"
+            )
+
+        data = response.json()
+        if not data.get("image"):
+            raise RuntimeError(f"No image in Nano Banana response: {data.get('error', 'unknown error')}")
+
+        pil_image = Image.open(BytesIO(base64.b64decode(data["image"]))).convert("RGB")
+
+        return GenerationResult(
+            image=pil_image,
+            prompt_used=request.prompt,
+            seed_used=data.get("seed", request.seed),
+            metadata={
+                "mode": "api",
+                "identity_strength": request.identity_strength,
+                "reference_weight": request.reference_weight,
+                "reference_count": len(request.reference_images),
+            },
         )
 
+    def _get_encoded_reference(self, image: Image.Image) -> str:
+        """Return the base64 payload for a reference image, encoding it once."""
+        key = id(image)
+        with self._reference_cache_lock:
+            cached = self._reference_cache.get(key)
+            if cached is not None and cached[0]() is image:
+                return cached[1]
+
+        encoded = self._encode_reference(image)
+        with self._reference_cache_lock:
+            # Drop the entry when the image is garbage collected so ids can't collide
+            ref = weakref.ref(image, lambda _, k=key: self._reference_cache.pop(k, None))
+            self._reference_cache[key] = (ref, encoded)
+        return encoded
+
+    def _encode_reference(self, image: Image.Image) -> str:
+        """
+        Encode a reference image as base64 JPEG for the API payload.
+
+        The image is downscaled to at most REFERENCE_MAX_EDGE on its long side,
+        and halved again until the encoded bytes fit under REFERENCE_MAX_BYTES.
+        """
+        ref = image.convert("RGB") if image.mode != "RGB" else image.copy()
+        ref.thumbnail((REFERENCE_MAX_EDGE, REFERENCE_MAX_EDGE), Image.Resampling.LANCZOS)
+
+        while True:
+            buf = BytesIO()
+            ref.save(buf, format="JPEG", quality=85)
+            if buf.tell() <= REFERENCE_MAX_BYTES or max(ref.size) <= 256:
+                break
+            ref.thumbnail((ref.width // 2, ref.height // 2), Image.Resampling.LANCZOS)
+
+        return base64.b64encode(buf.getvalue()).decode("utf-8")
+
 
 def get_adapter(dry_run: bool = True) -> NanoBananaAdapter:
     """
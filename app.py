@@ -4,6 +4,7 @@ Tal - Social Media Brain
 A streamlined tool for generating consistent Tal character images from simple prompts.
 """
 
+import hashlib
 import logging
 import os
 from io import BytesIO
@@ -13,26 +14,24 @@ import streamlit as st
 from PIL import Image
 from dotenv import load_dotenv
 
-from core.collage import (
-    LayoutConfig,
-    LayoutType,
-    compose_collage,
-)
-from core.generator import CollageGenerator
-from core.profile import create_profile
-from core.prompt_enhancer import get_enhancer, get_tal_character_prompt
-from core.publish import publish, PublishError
+# Generation, profile and publish modules are imported where they are used so
+# the first page render does not pay for model clients and numpy up front.
 from core.storage import (
+    PANEL_COMPRESS_LEVEL,
     ensure_run_dir,
     generate_run_id,
+    get_io_pool,
     save_collage,
     save_metadata,
-    save_panel,
+    save_panel_pngs,
 )
 
 # Load environment variables
 load_dotenv()
 
+# Tal's anchor image
+TAL_IMAGE_PATH = Path("image 3410 (1).png")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -77,24 +76,62 @@ def init_session_state():
         "tal_image": None,
         "character_profile": None,
         "generated_creatives": None,
+        "panel_pngs": None,
+        "panel_previews": None,
         "enhanced_prompt": None,
         "original_prompt": None,
         "current_run_id": None,
-        "generation_in_progress": False,
+        "last_submission_key": None,
     }
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
 
 
+@st.cache_resource
 def load_tal_image():
-    """Load Tal's default image."""
-    tal_path = Path("image 3410 (1).png")
+    """Load Tal's default image (decoded once per process and shared across reruns)."""
+    tal_path = TAL_IMAGE_PATH
     if tal_path.exists():
-        return Image.open(tal_path).convert("RGBA")
+        # Always convert: it decodes now, releases the file handle, and returns a
+        # plain Image.Image rather than the PngImageFile subclass from Image.open
+        with Image.open(tal_path) as img:
+            return img.convert("RGBA")
     return None
 
 
+def get_tal_image_key() -> str:
+    """Cache key for Tal's anchor image: its path, mtime and size."""
+    stat = TAL_IMAGE_PATH.stat()
+    return f"{TAL_IMAGE_PATH}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+@st.cache_data
+def get_profile(_tal_image: Image.Image, image_key: str, user_notes: str):
+    """
+    Create Tal's character profile, reusing it for identical image and notes.
+
+    The image itself is not hashed (leading underscore); image_key identifies it.
+    """
+    from core.profile import create_profile
+
+    return create_profile(_tal_image, user_notes=user_notes)
+
+
+def encode_png(image: Image.Image) -> bytes:
+    """Encode an image as PNG bytes for download buttons and the saved panel files."""
+    buf = BytesIO()
+    image.save(buf, format="PNG", compress_level=PANEL_COMPRESS_LEVEL, optimize=False)
+    return buf.getvalue()
+
+
+def encode_webp_preview(image: Image.Image) -> bytes:
+    """Encode an image as WebP bytes for inline display (cheaper than PNG)."""
+    buf = BytesIO()
+    image.save(buf, format="WEBP", quality=90, method=4)
+    return buf.getvalue()
+
+
 def get_api_status():
     """Check API configuration status."""
     api_key = os.environ.get("GOOGLE_API_KEY")
@@ -103,6 +140,8 @@ def get_api_status():
 
 def generate_creatives(user_prompt: str, num_creatives: int = 4):
     """Generate creative variations based on user prompt."""
+    from core.generator import CollageGenerator
+    from core.prompt_enhancer import get_enhancer
 
     # Initialize enhancer
     enhancer = get_enhancer()
@@ -119,7 +158,7 @@ def generate_creatives(user_prompt: str, num_creatives: int = 4):
         return None
 
     # Create a simple profile
-    profile = create_profile(tal_image, user_notes="Tal - Character reference for photorealistic generation")
+    profile = get_profile(tal_image, get_tal_image_key(), user_notes="Tal - Character reference for photorealistic generation")
 
     # Initialize generator
     api_available = get_api_status()
@@ -204,8 +243,27 @@ def render_main_ui():
 
     st.divider()
 
+    # Deduplicate submissions: the same request whose creatives are already on
+    # screen is not regenerated (🔄 Generate More clears them to allow it).
+    # This key is the real double-click protection; an "in progress" flag can't
+    # work because a new click interrupts the running script before it's checked.
+    submission_key = hashlib.sha256(
+        f"{user_prompt.strip()}|{num_creatives}".encode("utf-8")
+    ).hexdigest()
+    is_resubmission = bool(
+        generate_clicked
+        and submission_key == st.session_state.last_submission_key
+        and st.session_state.generated_creatives
+    )
+    if is_resubmission:
+        st.info("These creatives are already generated. Use 🔄 Generate More to regenerate.")
+
     # Generation process
-    if generate_clicked and user_prompt.strip():
+    if generate_clicked and user_prompt.strip() and not is_resubmission:
+        from core.generator import CollageGenerator
+        from core.prompt_enhancer import get_enhancer
+
+        st.session_state.last_submission_key = submission_key
         run_id = generate_run_id()
         st.session_state.current_run_id = run_id
 
@@ -232,7 +290,7 @@ def render_main_ui():
                 st.error("Tal's image not found!")
                 return
 
-            profile = create_profile(tal_image, user_notes="Tal - Character reference for photorealistic generation")
+            profile = get_profile(tal_image, get_tal_image_key(), user_notes="Tal - Character reference for photorealistic generation")
 
             # Step 3: Generate creatives
             st.write(f"🎨 **Step 3:** Generating {num_creatives} creative variations...")
@@ -255,23 +313,36 @@ def render_main_ui():
 
             progress = st.progress(0)
 
-            panels = generator.generate_panels(
+            # Panels arrive as each generation finishes; advance progress per panel
+            panels = []
+            for panel in generator.iter_panels(
                 anchor_image=tal_image,
                 thoughts=variations,
                 character_profile=profile,
                 style_preset="default",
                 panel_size=(1024, 1024),
                 use_tal_mode=True,
-            )
+            ):
+                panels.append(panel)
+                progress.progress(len(panels) / len(variations))
+            panels.sort(key=lambda panel: panel.index)
 
             progress.progress(100)
             st.session_state.generated_creatives = panels
+            # Encode preview and download bytes once here rather than on every rerun
+            panel_images = [panel.image for panel in panels]
+            st.session_state.panel_previews = list(
+                get_io_pool().map(encode_webp_preview, panel_images)
+            )
+            st.session_state.panel_pngs = list(
+                get_io_pool().map(encode_png, panel_images)
+            )
 
             # Step 4: Save outputs
             st.write("💾 **Step 4:** Saving creatives...")
             ensure_run_dir(run_id)
-            for i, panel in enumerate(panels):
-                save_panel(run_id, i, panel.image)
+            # The download PNGs are the panel files; write them instead of re-encoding
+            save_panel_pngs(run_id, st.session_state.panel_pngs)
 
             # Save metadata
             metadata = {
@@ -304,18 +375,24 @@ def render_main_ui():
         panels = st.session_state.generated_creatives
         cols = st.columns(len(panels))
 
+        panel_previews = st.session_state.panel_previews
+        if panel_previews is None or len(panel_previews) != len(panels):
+            panel_previews = [encode_webp_preview(panel.image) for panel in panels]
+            st.session_state.panel_previews = panel_previews
+
+        panel_pngs = st.session_state.panel_pngs
+        if panel_pngs is None or len(panel_pngs) != len(panels):
+            panel_pngs = [encode_png(panel.image) for panel in panels]
+            st.session_state.panel_pngs = panel_pngs
+
         for i, (col, panel) in enumerate(zip(cols, panels)):
             with col:
-                st.image(panel.image, use_container_width=True)
+                st.image(panel_previews[i], use_container_width=True)
 
                 # Download button for each creative
-                buf = BytesIO()
-                panel.image.save(buf, format="PNG")
-                buf.seek(0)
-
                 st.download_button(
                     f"⬇️ Download #{i+1}",
-                    data=buf,
+                    data=panel_pngs[i],
                     file_name=f"tal_creative_{st.session_state.current_run_id}_{i+1}.png",
                     mime="image/png",
                     use_container_width=True,
@@ -329,10 +406,15 @@ def render_main_ui():
             if st.button("🔄 Generate More", use_container_width=True):
                 # Keep the prompt, regenerate
                 st.session_state.generated_creatives = None
+                st.session_state.panel_pngs = None
+                st.session_state.panel_previews = None
                 st.rerun()
 
         with col_action2:
             if st.button("📤 Publish All", use_container_width=True):
+                from core.collage import LayoutConfig, LayoutType, compose_collage
+                from core.publish import publish
+
                 try:
                     # Save as collage first
                     tal_image = load_tal_image()
@@ -357,6 +439,8 @@ def render_main_ui():
         with col_action3:
             if st.button("🆕 New Prompt", use_container_width=True):
                 st.session_state.generated_creatives = None
+                st.session_state.panel_pngs = None
+                st.session_state.panel_previews = None
                 st.session_state.enhanced_prompt = None
                 st.session_state.original_prompt = None
                 st.rerun()
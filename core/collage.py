@@ -3,15 +3,33 @@ Collage Composition Module for Tile Collage Studio.
 Composes generated panels and anchor image into the final collage.
 """
 
+import bisect
+import functools
+import itertools
 import logging
+import os
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Iterable, Optional, Union
 
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+if TYPE_CHECKING:
+    from core.generator import GeneratedPanel
 
 logger = logging.getLogger(__name__)
 
+# Caption font candidates, probed once at import
+FONT_CANDIDATES = (
+    "/System/Library/Fonts/Helvetica.ttc",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+_FONT_PATH: Optional[str] = next(
+    (path for path in FONT_CANDIDATES if os.path.exists(path)), None
+)
+
 
 class AnchorPosition(Enum):
     """Position options for the anchor Tile image in the collage."""
@@ -56,20 +74,23 @@ class LayoutConfig:
     caption_bg_opacity: int = 180
 
 
+# Grid dimensions (rows, cols) per layout, built once at import
+_LAYOUT_GRIDS = MappingProxyType({
+    LayoutType.GRID_2X2: (2, 2),
+    LayoutType.GRID_3X3: (3, 3),
+    LayoutType.GRID_2X3: (2, 3),
+    LayoutType.GRID_3X2: (3, 2),
+    LayoutType.ROW_1X3: (1, 3),
+    LayoutType.ROW_1X4: (1, 4),
+    LayoutType.COLUMN_3X1: (3, 1),
+    LayoutType.COLUMN_4X1: (4, 1),
+    LayoutType.FEATURED: (2, 2),  # Special handling
+})
+
+
 def get_layout_grid(layout_type: LayoutType) -> tuple[int, int]:
     """Get grid dimensions (rows, cols) for a layout type."""
-    grids = {
-        LayoutType.GRID_2X2: (2, 2),
-        LayoutType.GRID_3X3: (3, 3),
-        LayoutType.GRID_2X3: (2, 3),
-        LayoutType.GRID_3X2: (3, 2),
-        LayoutType.ROW_1X3: (1, 3),
-        LayoutType.ROW_1X4: (1, 4),
-        LayoutType.COLUMN_3X1: (3, 1),
-        LayoutType.COLUMN_4X1: (4, 1),
-        LayoutType.FEATURED: (2, 2),  # Special handling
-    }
-    return grids.get(layout_type, (2, 2))
+    return _LAYOUT_GRIDS.get(layout_type, (2, 2))
 
 
 def get_panel_count(layout_type: LayoutType) -> int:
@@ -78,6 +99,19 @@ def get_panel_count(layout_type: LayoutType) -> int:
     return rows * cols
 
 
+# Anchor grid coordinates as functions of the grid's (rows, cols)
+_ANCHOR_POSITIONS = MappingProxyType({
+    AnchorPosition.TOP_LEFT: lambda rows, cols: (0, 0),
+    AnchorPosition.TOP_RIGHT: lambda rows, cols: (0, cols - 1),
+    AnchorPosition.BOTTOM_LEFT: lambda rows, cols: (rows - 1, 0),
+    AnchorPosition.BOTTOM_RIGHT: lambda rows, cols: (rows - 1, cols - 1),
+    AnchorPosition.CENTER_LEFT: lambda rows, cols: (rows // 2, 0),
+    AnchorPosition.CENTER_RIGHT: lambda rows, cols: (rows // 2, cols - 1),
+    AnchorPosition.CENTER: lambda rows, cols: (rows // 2, cols // 2),
+})
+
+
+@functools.lru_cache(maxsize=128)
 def get_anchor_grid_position(
     anchor_position: AnchorPosition,
     rows: int,
@@ -86,16 +120,8 @@ def get_anchor_grid_position(
     """
     Convert anchor position enum to grid coordinates (row, col).
     """
-    positions = {
-        AnchorPosition.TOP_LEFT: (0, 0),
-        AnchorPosition.TOP_RIGHT: (0, cols - 1),
-        AnchorPosition.BOTTOM_LEFT: (rows - 1, 0),
-        AnchorPosition.BOTTOM_RIGHT: (rows - 1, cols - 1),
-        AnchorPosition.CENTER_LEFT: (rows // 2, 0),
-        AnchorPosition.CENTER_RIGHT: (rows // 2, cols - 1),
-        AnchorPosition.CENTER: (rows // 2, cols // 2),
-    }
-    return positions.get(anchor_position, (0, 0))
+    position = _ANCHOR_POSITIONS.get(anchor_position)
+    return position(rows, cols) if position else (0, 0)
 
 
 def calculate_cell_size(
@@ -137,28 +163,69 @@ def resize_image_to_cell(
     target_width = cell_size[0] - 2 * border_width
     target_height = cell_size[1] - 2 * border_width
 
-    # Calculate aspect ratios
-    img_aspect = image.width / image.height
-    cell_aspect = target_width / target_height
+    # fit() picks the centered crop box first, so LANCZOS only resamples the
+    # pixels that end up in the cell
+    return ImageOps.fit(
+        image,
+        (target_width, target_height),
+        method=Image.Resampling.LANCZOS,
+        centering=(0.5, 0.5),
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _get_font(size: int) -> ImageFont.ImageFont:
+    """Load the caption font once per size, falling back to Pillow's default."""
+    if _FONT_PATH is not None:
+        try:
+            return ImageFont.truetype(_FONT_PATH, size)
+        except (OSError, IOError):
+            logger.warning(f"Failed to load caption font {_FONT_PATH}, using default")
+    return ImageFont.load_default()
 
-    if img_aspect > cell_aspect:
-        # Image is wider, fit by height and crop width
-        new_height = target_height
-        new_width = int(new_height * img_aspect)
-    else:
-        # Image is taller, fit by width and crop height
-        new_width = target_width
-        new_height = int(new_width / img_aspect)
 
-    # Resize
-    resized = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+@functools.lru_cache(maxsize=512)
+def _render_caption_strip(caption: str, width: int, font_size: int) -> Image.Image:
+    """
+    Render a caption's text as an "L" mask the size of its background strip.
+
+    Captions are pure functions of their arguments, so rendered masks are
+    cached and reused for every image that needs them. Treat the returned
+    image as read-only.
+    """
+    font = _get_font(font_size)
+
+    # Calculate text size
+    bbox = font.getbbox(caption)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
 
-    # Center crop
-    left = (new_width - target_width) // 2
-    top = (new_height - target_height) // 2
-    cropped = resized.crop((left, top, left + target_width, top + target_height))
+    # Truncate if too long: keep the longest prefix that fits with "..."
+    # (but never fewer than 7 characters), using one measurement per char
+    max_width = width - 20
+    if text_width > max_width and len(caption) > 10:
+        prefix_widths = list(itertools.accumulate(font.getlength(ch) for ch in caption))
+        cut = bisect.bisect_right(prefix_widths, max_width - font.getlength("..."))
+        caption = caption[:max(cut, 7)] + "..."
+        bbox = font.getbbox(caption)
+        text_width = bbox[2] - bbox[0]
 
-    return cropped
+    padding = 6
+    strip_height = text_height + padding * 2 + 5
+    mask = Image.new("L", (width, strip_height), 0)
+
+    draw = ImageDraw.Draw(mask)
+    text_x = (width - text_width) // 2
+    draw.text((text_x, padding), caption, font=font, fill=255)
+
+    return mask
+
+
+@functools.lru_cache(maxsize=16)
+def _darken_lut(bg_opacity: int) -> list[int]:
+    """RGB point() table equivalent to compositing black at bg_opacity."""
+    channel = [(v * (255 - bg_opacity) + 127) // 255 for v in range(256)]
+    return channel * 3
 
 
 def add_caption_to_image(
@@ -172,73 +239,101 @@ def add_caption_to_image(
     if not caption or caption.startswith("["):
         return image
 
-    img = image.copy()
-    draw = ImageDraw.Draw(img)
+    img = image.convert("RGB") if image.mode != "RGB" else image.copy()
+    _add_caption_inplace(img, caption, font_size, text_color, bg_opacity)
+    return img
+
 
-    # Get font
-    try:
-        font = ImageFont.truetype("/System/Library/Fonts/Helvetica.ttc", font_size)
-    except (OSError, IOError):
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", font_size)
-        except (OSError, IOError):
-            font = ImageFont.load_default()
+def _add_caption_inplace(
+    img: Image.Image,
+    caption: str,
+    font_size: int,
+    text_color: tuple[int, int, int],
+    bg_opacity: int,
+) -> None:
+    """Draw a caption overlay directly onto an RGB image the caller owns."""
+    text_mask = _render_caption_strip(caption, img.width, font_size)
+    bg_top = img.height - text_mask.height
+    bg_rect = (0, bg_top, img.width, img.height)
+
+    # Draw semi-transparent background. Blending black at bg_opacity is just a
+    # per-channel scale, so apply it as an RGB lookup table with no RGBA pass
+    img.paste(img.crop(bg_rect).point(_darken_lut(bg_opacity)), bg_rect[:2])
 
-    # Calculate text size and position
-    bbox = draw.textbbox((0, 0), caption, font=font)
-    text_width = bbox[2] - bbox[0]
-    text_height = bbox[3] - bbox[1]
+    # Draw text
+    img.paste(tuple(text_color), (0, bg_top), text_mask)
 
-    # Truncate if too long
-    max_width = img.width - 20
-    if text_width > max_width:
-        while text_width > max_width and len(caption) > 10:
-            caption = caption[:-4] + "..."
-            bbox = draw.textbbox((0, 0), caption, font=font)
-            text_width = bbox[2] - bbox[0]
 
-    # Draw semi-transparent background
-    padding = 6
-    bg_top = img.height - text_height - padding * 2 - 5
-    bg_rect = [0, bg_top, img.width, img.height]
+def _write_cell(canvas: np.ndarray, x: int, y: int, cell_image: Image.Image) -> None:
+    """Copy a cell image into the canvas with its top-left corner at (x, y)."""
+    if cell_image.mode != "RGB":
+        cell_image = cell_image.convert("RGB")
+    canvas[y:y + cell_image.height, x:x + cell_image.width] = np.asarray(cell_image)
 
-    overlay = Image.new("RGBA", img.size, (0, 0, 0, 0))
-    overlay_draw = ImageDraw.Draw(overlay)
-    overlay_draw.rectangle(bg_rect, fill=(0, 0, 0, bg_opacity))
 
-    img = img.convert("RGBA")
-    img = Image.alpha_composite(img, overlay)
-    img = img.convert("RGB")
+def _place_plain(
+    canvas: np.ndarray,
+    x: int,
+    y: int,
+    image: Image.Image,
+    caption: str,
+    cell_size: tuple[int, int],
+    config: LayoutConfig,
+) -> None:
+    """Fast path with no borders and no captions: resize and place the image."""
+    _write_cell(canvas, x, y, resize_image_to_cell(image, cell_size))
 
-    # Draw text
-    draw = ImageDraw.Draw(img)
-    text_x = (img.width - text_width) // 2
-    text_y = bg_top + padding
-    draw.text((text_x, text_y), caption, font=font, fill=text_color)
 
-    return img
+def _place_styled(
+    canvas: np.ndarray,
+    x: int,
+    y: int,
+    image: Image.Image,
+    caption: str,
+    cell_size: tuple[int, int],
+    config: LayoutConfig,
+) -> None:
+    """Path with borders and/or captions; borders are painted beforehand."""
+    bw = config.border_width
+    cell_image = resize_image_to_cell(image, cell_size, bw)
+    if config.show_captions and caption and not caption.startswith("["):
+        # The resized cell is private to this call, so caption it in place
+        if cell_image.mode != "RGB":
+            cell_image = cell_image.convert("RGB")
+        _add_caption_inplace(
+            cell_image,
+            caption,
+            config.caption_font_size,
+            config.caption_color,
+            config.caption_bg_opacity,
+        )
+
+    _write_cell(canvas, x + bw, y + bw, cell_image)
 
 
 def compose_collage(
     anchor_image: Image.Image,
-    panels: list[Image.Image],
+    panels: Iterable[Union[Image.Image, tuple[int, Image.Image], "GeneratedPanel"]],
     thoughts: list[str],
     config: LayoutConfig,
 ) -> Image.Image:
     """
     Compose the final collage from anchor image and generated panels.
 
+    Panels are placed as they are consumed, so a lazy iterable (such as
+    CollageGenerator.iter_panels) overlaps layout with generation.
+
     Args:
         anchor_image: The fixed Tile reference image
-        panels: List of generated panel images
-        thoughts: List of thought captions (parallel to panels)
+        panels: Generated panel images in order, or (index, image) pairs or
+            GeneratedPanel objects in any order (placed by their index)
+        thoughts: List of thought captions (parallel to panel indices)
         config: Layout configuration
 
     Returns:
         Final composed collage image
     """
     rows, cols = get_layout_grid(config.layout_type)
-    total_cells = rows * cols
     anchor_row, anchor_col = get_anchor_grid_position(
         config.anchor_position, rows, cols
     )
@@ -248,71 +343,54 @@ def compose_collage(
         f"({rows}x{cols}), anchor at ({anchor_row}, {anchor_col})"
     )
 
-    # Create base collage
-    collage = Image.new("RGB", config.output_size, config.background_color)
+    # Render every cell into one preallocated buffer instead of pasting images
+    width, height = config.output_size
     cell_size = calculate_cell_size(
         config.output_size, rows, cols, config.padding
     )
-
-    # Track which cells are filled
-    panel_index = 0
-
+    cell_w, cell_h = cell_size
+    bw = config.border_width
+    padding = config.padding
+    canvas = np.full((height, width, 3), config.background_color, dtype=np.uint8)
+
+    # Precompute every cell's top-left position; panel slots skip the anchor
+    anchor_xy = None
+    slots = []
     for row in range(rows):
         for col in range(cols):
-            x, y = get_cell_position(row, col, cell_size, config.padding)
-
-            # Determine which image goes in this cell
+            xy = (padding + col * (cell_w + padding), padding + row * (cell_h + padding))
             if row == anchor_row and col == anchor_col:
-                # Place anchor image
-                cell_image = resize_image_to_cell(
-                    anchor_image, cell_size, config.border_width
-                )
-                caption = "[Tal]" if config.show_captions else ""
+                anchor_xy = xy
             else:
-                # Place generated panel
-                if panel_index < len(panels):
-                    cell_image = resize_image_to_cell(
-                        panels[panel_index], cell_size, config.border_width
-                    )
-                    caption = thoughts[panel_index] if panel_index < len(thoughts) else ""
-                    panel_index += 1
-                else:
-                    # No more panels, create empty cell
-                    cell_image = Image.new(
-                        "RGB",
-                        (cell_size[0] - 2 * config.border_width,
-                         cell_size[1] - 2 * config.border_width),
-                        config.background_color,
-                    )
-                    caption = ""
-
-            # Add caption if enabled
-            if config.show_captions and caption:
-                cell_image = add_caption_to_image(
-                    cell_image,
-                    caption,
-                    config.caption_font_size,
-                    config.caption_color,
-                    config.caption_bg_opacity,
-                )
-
-            # Add border
-            if config.border_width > 0:
-                bordered = Image.new(
-                    "RGB",
-                    (cell_size[0], cell_size[1]),
-                    config.border_color,
-                )
-                bordered.paste(
-                    cell_image,
-                    (config.border_width, config.border_width),
-                )
-                cell_image = bordered
-
-            # Paste into collage
-            collage.paste(cell_image, (x, y))
-
-    return collage
+                slots.append(xy)
+
+    if bw == 0 and not config.show_captions:
+        place = _place_plain
+    else:
+        place = _place_styled
+        # Paint every border rectangle first; cell images are then written inset
+        if bw > 0:
+            for x, y in (anchor_xy, *slots):
+                canvas[y:y + cell_h, x:x + cell_w] = config.border_color
+                canvas[y + bw:y + cell_h - bw, x + bw:x + cell_w - bw] = config.background_color
+
+    place(canvas, *anchor_xy, anchor_image, "[Tal]", cell_size, config)
+
+    # Cells without a panel are left as background
+    for order, panel in enumerate(panels):
+        if isinstance(panel, tuple):
+            index, image = panel
+        elif isinstance(panel, Image.Image):
+            index, image = order, panel
+        else:
+            # GeneratedPanel (duck-typed so core.generator isn't imported here)
+            index, image = panel.index, panel.image
+        if index >= len(slots):
+            continue
+        caption = thoughts[index] if index < len(thoughts) else ""
+        place(canvas, *slots[index], image, caption, cell_size, config)
+
+    return Image.fromarray(canvas, "RGB")
 
 
 def get_required_panel_count(layout_type: LayoutType) -> int:
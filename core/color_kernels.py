@@ -0,0 +1,34 @@
+"""
+Numba kernels for profile color analysis in Tile Collage Studio.
+Optional: core.profile uses them when numba is installed, and only on the
+bucketed-palette fallback that runs without scikit-learn.
+"""
+
+import numba
+import numpy as np
+
+
+@numba.njit(parallel=True, cache=True)
+def hist512(pixels):
+    """
+    Count pixels per 3-bit-per-channel color bucket.
+
+    Takes an (N, 3) uint8 array and returns 512 counts indexed by
+    (r >> 5) << 6 | (g >> 5) << 3 | (b >> 5).
+    """
+    n = pixels.shape[0]
+    n_chunks = numba.get_num_threads()
+    chunk = (n + n_chunks - 1) // n_chunks
+
+    # One private histogram per chunk so parallel increments never collide
+    partial = np.zeros((n_chunks, 512), dtype=np.int64)
+    for c in numba.prange(n_chunks):
+        start = c * chunk
+        end = min(start + chunk, n)
+        for i in range(start, end):
+            r = pixels[i, 0] >> 5
+            g = pixels[i, 1] >> 5
+            b = pixels[i, 2] >> 5
+            partial[c, (r << 6) | (g << 3) | b] += 1
+
+    return partial.sum(axis=0)
@@ -3,9 +3,11 @@ Generator module for Tile Collage Studio.
 Builds prompts with character consistency and orchestrates image generation.
 """
 
+import functools
 import logging
-from dataclasses import dataclass
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
 
 from PIL import Image
 
@@ -22,8 +24,11 @@ from core.prompt_enhancer import PromptEnhancer, get_enhancer, get_tal_character
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on panels generated at once; keeps API calls within rate limits
+MAX_CONCURRENT_PANELS = 8
 
-@dataclass
+
+@dataclass(frozen=True)
 class StyleConfig:
     """Configuration for visual style across the collage."""
 
@@ -32,9 +37,10 @@ class StyleConfig:
     lighting: str = "soft natural lighting"
     art_style: str = "photorealistic"
     consistency_note: str = "maintain consistent lighting and color grading across all scenes"
+    _suffix: str = field(init=False, repr=False, compare=False, default="")
 
-    def to_prompt_suffix(self) -> str:
-        """Convert style config to prompt suffix."""
+    def __post_init__(self):
+        # Frozen, so the suffix can be built once and never goes stale
         parts = [
             f"{self.art_style} style",
             f"{self.mood} mood",
@@ -42,50 +48,61 @@ class StyleConfig:
             f"{self.color_palette} color palette",
             self.consistency_note,
         ]
-        return ", ".join(parts)
+        object.__setattr__(self, "_suffix", ", ".join(parts))
+
+    def to_prompt_suffix(self) -> str:
+        """Convert style config to prompt suffix."""
+        return self._suffix
 
 
-# Predefined style presets
-STYLE_PRESETS = {
-    "cinematic": StyleConfig(
+# Predefined style presets, built on first use by get_style_preset
+_STYLE_FACTORIES = {
+    "cinematic": lambda: StyleConfig(
         mood="dramatic",
         color_palette="cinematic teal and orange",
         lighting="dramatic cinematic lighting",
         art_style="cinematic film still",
         consistency_note="consistent cinematic look across all frames",
     ),
-    "bright_cheerful": StyleConfig(
+    "bright_cheerful": lambda: StyleConfig(
         mood="happy and cheerful",
         color_palette="bright and vibrant colors",
         lighting="bright sunny lighting",
         art_style="clean modern photography",
         consistency_note="maintain bright cheerful atmosphere throughout",
     ),
-    "moody_artistic": StyleConfig(
+    "moody_artistic": lambda: StyleConfig(
         mood="contemplative and artistic",
         color_palette="muted earth tones",
         lighting="soft diffused lighting with shadows",
         art_style="artistic portrait photography",
         consistency_note="consistent moody artistic feel",
     ),
-    "minimalist": StyleConfig(
+    "minimalist": lambda: StyleConfig(
         mood="calm and focused",
         color_palette="minimal, mostly neutral with accent colors",
         lighting="clean even lighting",
         art_style="minimalist clean aesthetic",
         consistency_note="maintain clean minimal look",
     ),
-    "vintage": StyleConfig(
+    "vintage": lambda: StyleConfig(
         mood="nostalgic",
         color_palette="warm vintage film colors",
         lighting="soft golden hour lighting",
         art_style="vintage film photography",
         consistency_note="consistent retro film aesthetic",
     ),
-    "default": StyleConfig(),
+    "default": StyleConfig,
 }
 
 
+@functools.lru_cache(maxsize=None)
+def get_style_preset(name: str) -> StyleConfig:
+    """Get a predefined style preset by name, falling back to the default preset."""
+    factory = _STYLE_FACTORIES.get(name) or _STYLE_FACTORIES["default"]
+    return factory()
+
+
 @dataclass
 class GeneratedPanel:
     """A single generated panel for the collage."""
@@ -97,6 +114,18 @@ class GeneratedPanel:
     metadata: dict
 
 
+# Tal's EXACT character description - NEVER MODIFY. Resolved once at import.
+_TAL_PROMPT = get_tal_character_prompt()
+
+NEUTRAL_SCENES = (
+    "standing in a contemplative pose",
+    "looking thoughtfully into the distance",
+    "in a moment of peaceful reflection",
+    "with a gentle, natural expression",
+    "in a candid, relaxed moment",
+)
+
+
 def build_scene_prompt(
     thought: str,
     character_profile: CharacterProfile,
@@ -121,28 +150,35 @@ def build_scene_prompt(
     Returns:
         Complete prompt string for the image generator
     """
+    if use_tal_mode:
+        character_desc = _TAL_PROMPT
+    else:
+        character_desc = character_profile.to_prompt_string()
+
+    return _scene_prompt(thought, character_desc, use_tal_mode, is_pre_enhanced)
+
+
+@functools.lru_cache(maxsize=256)
+def _scene_prompt(
+    thought: str,
+    character_desc: str,
+    use_tal_mode: bool,
+    is_pre_enhanced: bool,
+) -> str:
+    """Memoized body of build_scene_prompt over its hashable inputs."""
     # If prompt was already enhanced by Gemini, it should already have character description
     # Just ensure it starts with the exact character prompt for photorealistic generation
     if is_pre_enhanced and use_tal_mode:
-        tal_exact = get_tal_character_prompt()
         # Check if enhanced prompt already starts with photorealistic character description
         if thought.lower().startswith("photorealistic"):
             return thought
         else:
             # Prepend exact character description for reference-based generation
-            return f"{tal_exact}. {thought}"
-
-    if use_tal_mode:
-        # Use Tal's EXACT character description - NEVER MODIFY
-        character_desc = get_tal_character_prompt()
-    else:
-        character_desc = character_profile.to_prompt_string()
+            return f"{character_desc}. {thought}"
 
     # Build the scene description
     # Character description MUST come first and be complete
-    prompt = f"{character_desc}. Scene: {thought}."
-
-    return prompt
+    return f"{character_desc}. Scene: {thought}."
 
 
 def build_neutral_scene_prompt(
@@ -154,26 +190,52 @@ def build_neutral_scene_prompt(
     Build a neutral scene prompt for padding when needed.
     The character should still be present and consistent.
     """
-    character_desc = character_profile.to_prompt_string()
+    return _neutral_scene_prompt(
+        character_profile.to_prompt_string(),
+        character_profile.get_consistency_constraints(),
+        style_config,
+        panel_index % len(NEUTRAL_SCENES),
+    )
 
-    neutral_scenes = [
-        "standing in a contemplative pose",
-        "looking thoughtfully into the distance",
-        "in a moment of peaceful reflection",
-        "with a gentle, natural expression",
-        "in a candid, relaxed moment",
-    ]
 
-    scene = neutral_scenes[panel_index % len(neutral_scenes)]
+@functools.lru_cache(maxsize=256)
+def _neutral_scene_prompt(
+    character_desc: str,
+    constraints: str,
+    style_config: StyleConfig,
+    scene_index: int,
+) -> str:
+    """Memoized body of build_neutral_scene_prompt over its hashable inputs."""
+    scene = NEUTRAL_SCENES[scene_index]
 
     return (
         f"A portrait of {character_desc}, {scene}. "
         f"Same person as reference image, exact same features and appearance. "
         f"{style_config.to_prompt_suffix()}. "
-        f"{character_profile.get_consistency_constraints()}"
+        f"{constraints}"
     )
 
 
+def prepare_reference_image(
+    image: Image.Image,
+    panel_size: tuple[int, int],
+) -> Image.Image:
+    """
+    Prepare a reference image once before it is sent with every panel request.
+
+    Converts to RGB (dropping alpha) and downscales, keeping aspect ratio, so the
+    long edge is no larger than the largest panel dimension. The caller's image
+    is never modified.
+    """
+    ref = image.convert("RGB") if image.mode != "RGB" else image
+    max_edge = max(panel_size)
+    if max(ref.size) > max_edge:
+        if ref is image:
+            ref = ref.copy()
+        ref.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    return ref
+
+
 def get_best_adapter(dry_run: bool = True, use_google: bool = True) -> ImageGeneratorAdapter:
     """
     Get the best available adapter based on configuration.
@@ -245,6 +307,39 @@ class CollageGenerator:
         """
         Generate all panels for the collage.
 
+        Takes the same arguments as iter_panels, and waits for every panel.
+
+        Returns:
+            List of GeneratedPanel objects, in thought order
+        """
+        panels = self.iter_panels(
+            anchor_image=anchor_image,
+            thoughts=thoughts,
+            character_profile=character_profile,
+            style_preset=style_preset,
+            custom_style=custom_style,
+            panel_size=panel_size,
+            identity_strength=identity_strength,
+            seed=seed,
+            use_tal_mode=use_tal_mode,
+        )
+        return sorted(panels, key=lambda panel: panel.index)
+
+    def iter_panels(
+        self,
+        anchor_image: Image.Image,
+        thoughts: list[str],
+        character_profile: CharacterProfile,
+        style_preset: str = "default",
+        custom_style: Optional[StyleConfig] = None,
+        panel_size: tuple[int, int] = (512, 512),
+        identity_strength: float = 0.85,
+        seed: Optional[int] = None,
+        use_tal_mode: bool = True,
+    ) -> Iterator[GeneratedPanel]:
+        """
+        Generate panels for the collage, yielding each one as soon as it is ready.
+
         Args:
             anchor_image: The reference Tal image
             thoughts: List of thought strings for each panel
@@ -256,39 +351,59 @@ class CollageGenerator:
             seed: Optional random seed for reproducibility
             use_tal_mode: If True, use Tal-specific character prompting
 
-        Returns:
-            List of GeneratedPanel objects
+        Yields:
+            GeneratedPanel objects in completion order; use panel.index for position
         """
-        style = custom_style or STYLE_PRESETS.get(style_preset, STYLE_PRESETS["default"])
+        style = custom_style or get_style_preset(style_preset)
 
-        panels = []
         total_panels = len(thoughts)
 
         logger.info(f"Generating {total_panels} panels with style preset: {style_preset}")
 
+        workers = max(1, min(total_panels, MAX_CONCURRENT_PANELS))
+
         # Enhance all prompts first if enhancer is available
-        enhanced_thoughts = []
         if self.enhance_prompts and self.enhancer:
             logger.info("Enhancing prompts with Gemini...")
-            for thought in thoughts:
-                try:
-                    enhanced = self.enhancer.enhance(thought, style_preset)
-                    enhanced_thoughts.append(enhanced)
-                    logger.info(f"Enhanced: '{thought[:30]}...' -> '{enhanced['enhanced'][:50]}...'")
-                except Exception as e:
-                    logger.warning(f"Enhancement failed for '{thought}': {e}")
-                    enhanced_thoughts.append({"original": thought, "enhanced": thought})
+            try:
+                enhanced_thoughts = self.enhancer.enhance_batch(thoughts, style_preset)
+            except Exception as e:
+                logger.warning(f"Batch enhancement failed: {e}")
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    enhanced_thoughts = list(
+                        executor.map(lambda t: self._enhance_thought(t, style_preset), thoughts)
+                    )
         else:
-            enhanced_thoughts = [{"original": t, "enhanced": t} for t in thoughts]
-
-        for i, (thought, enhanced) in enumerate(zip(thoughts, enhanced_thoughts)):
-            logger.info(f"Generating panel {i + 1}/{total_panels}: {thought[:50]}...")
-
-            # Use enhanced prompt if available
-            scene_thought = enhanced.get("enhanced", thought)
+            # No enhancement: thoughts are used as-is, no per-thought dicts
+            enhanced_thoughts = None
+
+        anchor_reference = prepare_reference_image(anchor_image, panel_size)
+
+        # Fields shared by every panel's request; one reference list is reused
+        # so adapters can recognise the anchor and reuse its encoded bytes
+        base_kwargs = dict(
+            reference_images=[anchor_reference],
+            width=panel_size[0],
+            height=panel_size[1],
+            identity_strength=identity_strength,
+            reference_weight=0.75,
+            style_preset=style_preset,
+        )
 
-            # Check if this was enhanced by Gemini
-            is_enhanced = self.enhance_prompts and enhanced.get("enhanced") != enhanced.get("original")
+        # Build every request up front; only the adapter calls run concurrently
+        prompts = []
+        generation_requests = []
+        for i, thought in enumerate(thoughts):
+            if enhanced_thoughts is None:
+                scene_thought = thought
+                is_enhanced = False
+            else:
+                enhanced = enhanced_thoughts[i]
+                # Use enhanced prompt if available
+                scene_thought = enhanced.get("enhanced", thought)
+
+                # Check if this was enhanced by Gemini
+                is_enhanced = enhanced.get("enhanced") != enhanced.get("original")
 
             prompt = build_scene_prompt(
                 thought=scene_thought,
@@ -299,39 +414,71 @@ class CollageGenerator:
                 use_tal_mode=use_tal_mode,
                 is_pre_enhanced=is_enhanced,
             )
+            prompts.append(prompt)
 
-            request = GenerationRequest(
-                prompt=prompt,
-                reference_images=[anchor_image],
-                width=panel_size[0],
-                height=panel_size[1],
-                seed=seed + i if seed else None,
-                identity_strength=identity_strength,
-                reference_weight=0.75,
-                style_preset=style_preset,
-            )
-
-            result = self.adapter.generate(request)
-
-            panels.append(
-                GeneratedPanel(
-                    thought=thought,
+            generation_requests.append(
+                GenerationRequest(
                     prompt=prompt,
-                    image=result.image,
-                    index=i,
-                    metadata={
-                        "seed_used": result.seed_used,
-                        "generation_metadata": result.metadata,
-                        "original_thought": enhanced.get("original", thought),
-                        "enhanced_prompt": enhanced.get("enhanced", thought),
-                        "scene_description": enhanced.get("scene_description", ""),
-                        "mood": enhanced.get("mood", ""),
-                        "prompt_enhanced": self.enhance_prompts,
-                    },
+                    seed=seed + i if seed else None,
+                    **base_kwargs,
                 )
             )
 
-        return panels
+        logger.info(f"Dispatching {total_panels} generation requests ({workers} workers)")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.adapter.generate, request): i
+                for i, request in enumerate(generation_requests)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                yield self._build_panel(
+                    i, thoughts[i], prompts[i], future.result(), enhanced_thoughts
+                )
+
+    def _build_panel(
+        self,
+        i: int,
+        thought: str,
+        prompt: str,
+        result: GenerationResult,
+        enhanced_thoughts: Optional[list[dict]],
+    ) -> GeneratedPanel:
+        """Wrap a generation result with its prompt and enhancement metadata."""
+        if enhanced_thoughts is None:
+            original, enhanced_prompt, scene_description, mood = thought, thought, "", ""
+        else:
+            enhanced = enhanced_thoughts[i]
+            original = enhanced.get("original", thought)
+            enhanced_prompt = enhanced.get("enhanced", thought)
+            scene_description = enhanced.get("scene_description", "")
+            mood = enhanced.get("mood", "")
+
+        return GeneratedPanel(
+            thought=thought,
+            prompt=prompt,
+            image=result.image,
+            index=i,
+            metadata={
+                "seed_used": result.seed_used,
+                "generation_metadata": result.metadata,
+                "original_thought": original,
+                "enhanced_prompt": enhanced_prompt,
+                "scene_description": scene_description,
+                "mood": mood,
+                "prompt_enhanced": self.enhance_prompts,
+            },
+        )
+
+    def _enhance_thought(self, thought: str, style_preset: str) -> dict:
+        """Enhance a single thought, falling back to the raw thought on failure."""
+        try:
+            enhanced = self.enhancer.enhance(thought, style_preset)
+            logger.info(f"Enhanced: '{thought[:30]}...' -> '{enhanced['enhanced'][:50]}...'")
+            return enhanced
+        except Exception as e:
+            logger.warning(f"Enhancement failed for '{thought}': {e}")
+            return {"original": thought, "enhanced": thought}
 
     def generate_padding_panels(
         self,
@@ -346,19 +493,25 @@ class CollageGenerator:
         """
         Generate neutral padding panels when more panels are needed than thoughts.
         """
-        style = STYLE_PRESETS.get(style_preset, STYLE_PRESETS["default"])
+        style = get_style_preset(style_preset)
         panels = []
 
-        for i in range(count):
-            prompt = build_neutral_scene_prompt(
+        # Build all padding prompts for this (profile, style) up front
+        prompts = [
+            build_neutral_scene_prompt(
                 character_profile=character_profile,
                 style_config=style,
                 panel_index=start_index + i,
             )
+            for i in range(count)
+        ]
+
+        reference_images = [prepare_reference_image(anchor_image, panel_size)]
 
+        for i, prompt in enumerate(prompts):
             request = GenerationRequest(
                 prompt=prompt,
-                reference_images=[anchor_image],
+                reference_images=reference_images,
                 width=panel_size[0],
                 height=panel_size[1],
                 identity_strength=identity_strength,
@@ -0,0 +1,50 @@
+"""
+JSON helpers for Tile Collage Studio.
+Uses orjson when installed and falls back to the standard library. Kept free of
+image dependencies so text-only modules can import it cheaply.
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson  # Optional: several times faster JSON encoding/decoding
+except ImportError:
+    orjson = None
+
+# orjson options matching what json.dump accepted before (int keys etc.)
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def write_json(path: Path, data: Any) -> None:
+    """Write an indented JSON file."""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=_ORJSON_OPTS | orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+
+def read_json(path: Path) -> Any:
+    """Read a JSON file."""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def encode_jsonl(record: Any) -> bytes:
+    """Encode one record as a newline-terminated JSONL line."""
+    if orjson is not None:
+        return orjson.dumps(record, option=_ORJSON_OPTS) + b"\n"
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+def parse_json(data: bytes) -> Any:
+    """Parse one JSON document, e.g. a JSONL line."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
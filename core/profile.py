@@ -4,19 +4,54 @@ Derives and stores consistent character identity from the anchor Tile photo.
 """
 
 import hashlib
-import json
 import logging
-from dataclasses import dataclass, field, asdict
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from PIL import Image
-import numpy as np
+from core.jsonio import read_json, write_json
+
+# numpy and PIL are imported where they are used, so importing
+# CharacterProfile stays cheap
+if TYPE_CHECKING:
+    import numpy as np
+
+    from PIL import Image
+
+try:
+    import xxhash  # Optional: faster non-cryptographic hashing for cache keys
+except ImportError:
+    xxhash = None
+
+# Optional numba kernel for the bucketed palette, imported on first use: it only
+# runs on the fallback path used when scikit-learn is missing. None once the
+# import has failed, so a missing numba is tried only once.
+_UNRESOLVED = object()
+_hist512 = _UNRESOLVED
 
 logger = logging.getLogger(__name__)
 
+# Bounded cache of (image_hash, dominant_colors) per anchor image fingerprint
+IMAGE_ANALYSIS_CACHE_SIZE = 32
+_image_analysis_cache: "OrderedDict[tuple, tuple[str, tuple[str, ...]]]" = OrderedDict()
+_image_analysis_cache_lock = threading.Lock()
+
+# Size the anchor is shrunk to before hashing it for the profile and extracting its palette
+ANALYSIS_SIZE = (128, 128)
+
+# Keyword patterns for parsing user notes in create_profile
+_NOTES_MALE = re.compile(r"\b(male|man|boy|he|him|his)\b", re.IGNORECASE)
+_NOTES_FEMALE = re.compile(r"\b(female|woman|girl|she|her|hers)\b", re.IGNORECASE)
+_NOTES_TEEN = re.compile(r"\b(young|teen|teenager)\b", re.IGNORECASE)
+_NOTES_ADULT = re.compile(r"\b(adult|middle-aged)\b", re.IGNORECASE)
+_NOTES_ELDERLY = re.compile(r"\b(elderly|old|senior)\b", re.IGNORECASE)
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class CharacterProfile:
     """
     Represents the consistent identity of the Tile character.
@@ -33,33 +68,37 @@ class CharacterProfile:
 
     # Clothing and accessories
     signature_clothing: str = "casual attire"
-    accessories: list[str] = field(default_factory=list)
-    distinguishing_marks: list[str] = field(default_factory=list)
+    accessories: tuple[str, ...] = ()
+    distinguishing_marks: tuple[str, ...] = ()
 
     # User-provided notes
     user_notes: str = ""
 
     # Computed properties
     image_hash: str = ""
-    dominant_colors: list[str] = field(default_factory=list)
+    dominant_colors: tuple[str, ...] = ()
 
     # Embedding placeholder for future use with real models
-    embedding_placeholder: Optional[list[float]] = None
+    embedding_placeholder: Optional[tuple[float, ...]] = None
 
     # Constraints that must not change across scenes
-    do_not_change: list[str] = field(default_factory=lambda: [
+    do_not_change: tuple[str, ...] = (
         "same face structure and features",
         "same hairstyle and hair color",
         "same outfit and clothing style",
         "same body proportions",
         "same accessories and distinguishing marks",
-    ])
+    )
 
-    def to_prompt_string(self) -> str:
-        """
-        Convert profile to a textual prompt segment for image generation.
-        This string should be prepended to every scene prompt.
-        """
+    _prompt_string: str = field(init=False, repr=False, compare=False, default="")
+    _constraints: str = field(init=False, repr=False, compare=False, default="")
+
+    def __post_init__(self):
+        # Frozen, so both prompt segments can be built once and never go stale
+        object.__setattr__(self, "_prompt_string", self._build_prompt_string())
+        object.__setattr__(self, "_constraints", "IMPORTANT: " + "; ".join(self.do_not_change))
+
+    def _build_prompt_string(self) -> str:
         parts = []
 
         # Core identity
@@ -101,49 +140,200 @@ class CharacterProfile:
 
         return "; ".join(parts) if parts else "person matching the reference image exactly"
 
+    def to_prompt_string(self) -> str:
+        """
+        Convert profile to a textual prompt segment for image generation.
+        This string should be prepended to every scene prompt.
+        """
+        return self._prompt_string
+
     def get_consistency_constraints(self) -> str:
         """
         Get the 'do not change' constraints as a prompt string.
         """
-        return "IMPORTANT: " + "; ".join(self.do_not_change)
+        return self._constraints
 
     def to_dict(self) -> dict:
         """Convert to dictionary for serialization."""
-        return asdict(self)
+        embedding = self.embedding_placeholder
+        return {
+            "gender_presentation": self.gender_presentation,
+            "age_range": self.age_range,
+            "face_shape": self.face_shape,
+            "hairstyle": self.hairstyle,
+            "hair_color": self.hair_color,
+            "skin_tone": self.skin_tone,
+            "signature_clothing": self.signature_clothing,
+            "accessories": list(self.accessories),
+            "distinguishing_marks": list(self.distinguishing_marks),
+            "user_notes": self.user_notes,
+            "image_hash": self.image_hash,
+            "dominant_colors": list(self.dominant_colors),
+            "embedding_placeholder": list(embedding) if embedding is not None else None,
+            "do_not_change": list(self.do_not_change),
+        }
 
     @classmethod
     def from_dict(cls, data: dict) -> "CharacterProfile":
         """Create from dictionary."""
-        return cls(**data)
+        # JSON gives lists back; the profile stores tuples
+        return cls(**{
+            key: tuple(value) if isinstance(value, list) else value
+            for key, value in data.items()
+        })
 
 
-def compute_image_hash(image: Image.Image) -> str:
+def compute_image_hash(image: "Image.Image") -> str:
     """Compute a hash of the image for caching purposes."""
-    img_array = np.array(image.convert("RGB"))
-    return hashlib.md5(img_array.tobytes()).hexdigest()
+    rgb = image if image.mode == "RGB" else image.convert("RGB")
+    return _hash_buffer(rgb.tobytes())
 
 
-def extract_dominant_colors(image: Image.Image, num_colors: int = 5) -> list[str]:
+def compute_image_hash_from_arr(pixels: "np.ndarray") -> str:
+    """Compute a cache hash from an RGB pixel array."""
+    import numpy as np
+
+    return _hash_buffer(np.ascontiguousarray(pixels))
+
+
+def _hash_buffer(buf) -> str:
+    """Fast non-cryptographic 128-bit hex digest of a bytes-like buffer."""
+    if xxhash is not None:
+        return xxhash.xxh3_128(buf).hexdigest()
+    return hashlib.blake2b(buf, digest_size=16).hexdigest()
+
+
+def downsample_for_analysis(image: "Image.Image") -> "np.ndarray":
+    """Convert and shrink an image once for hashing and palette extraction."""
+    import numpy as np
+
+    rgb = image if image.mode == "RGB" else image.convert("RGB")
+    return np.asarray(rgb.resize(ANALYSIS_SIZE), dtype=np.uint8)
+
+
+def extract_dominant_colors(image: "Image.Image", num_colors: int = 5) -> list[str]:
     """
     Extract dominant colors from an image.
     Returns color names/hex codes.
     """
-    img = image.convert("RGB").resize((100, 100))
-    pixels = np.array(img).reshape(-1, 3)
-
-    # Simple k-means-like clustering for dominant colors
-    from collections import Counter
-
-    # Quantize colors to reduce variety
-    quantized = (pixels // 32) * 32
-    color_counts = Counter(map(tuple, quantized))
-    top_colors = color_counts.most_common(num_colors)
-
-    return [f"#{r:02x}{g:02x}{b:02x}" for (r, g, b), _ in top_colors]
+    return extract_dominant_colors_from_arr(downsample_for_analysis(image), num_colors)
+
+
+def extract_dominant_colors_from_arr(pixels: "np.ndarray", num_colors: int = 5) -> list[str]:
+    """Extract dominant colors from an RGB pixel array."""
+    pixels = pixels.reshape(-1, 3)
+
+    try:
+        return _kmeans_dominant_colors(pixels, num_colors)
+    except ImportError:
+        logger.debug("scikit-learn not installed, using bucketed dominant colors")
+        return _bucket_dominant_colors(pixels, num_colors)
+
+
+def _kmeans_dominant_colors(pixels: "np.ndarray", num_colors: int) -> list[str]:
+    """Cluster pixels with k-means and return centroids by cluster size."""
+    import numpy as np
+    from sklearn.cluster import MiniBatchKMeans
+
+    # Can't ask for more clusters than there are distinct colors
+    num_colors = min(num_colors, len(np.unique(pixels, axis=0)))
+    if num_colors == 0:
+        return []
+
+    # Fixed seed so the same anchor always yields the same palette
+    km = MiniBatchKMeans(
+        n_clusters=num_colors, n_init=3, batch_size=1024, random_state=0
+    ).fit(pixels.astype(np.float32))
+
+    # labels_ holds the nearest centroid for every pixel after the fit
+    counts = np.bincount(km.labels_, minlength=num_colors)
+    centers = np.clip(np.rint(km.cluster_centers_), 0, 255).astype(np.uint8)
+
+    return [
+        f"#{r:02x}{g:02x}{b:02x}"
+        for r, g, b in centers[np.argsort(-counts, kind="stable")].tolist()
+    ]
+
+
+def _bucket_dominant_colors(pixels: "np.ndarray", num_colors: int) -> list[str]:
+    """Return the most populated 3-bit-per-channel color buckets."""
+    import numpy as np
+
+    counts = _color_histogram(pixels)
+
+    # Most common non-empty buckets, highest count first
+    k = min(num_colors, int(np.count_nonzero(counts)))
+    if k == 0:
+        return []
+    top = np.argpartition(counts, -k)[-k:]
+    top = top[np.argsort(-counts[top], kind="stable")]
+
+    r = ((top >> 6) & 7) << 5
+    g = ((top >> 3) & 7) << 5
+    b = (top & 7) << 5
+    return [f"#{int(rv):02x}{int(gv):02x}{int(bv):02x}" for rv, gv, bv in zip(r, g, b)]
+
+
+def _color_histogram(pixels: "np.ndarray") -> "np.ndarray":
+    """Count (N, 3) uint8 pixels into 512 3-bit-per-channel buckets."""
+    import numpy as np
+
+    global _hist512
+    if _hist512 is _UNRESOLVED:
+        try:
+            from core.color_kernels import hist512 as _hist512
+        except ImportError:
+            _hist512 = None
+    if _hist512 is not None:
+        return _hist512(np.ascontiguousarray(pixels, dtype=np.uint8))
+
+    # Quantize each channel to 3 bits and pack into a single 9-bit bucket index
+    q = pixels >> 5
+    idx = (q[:, 0].astype(np.uint16) << 6) | (q[:, 1] << 3) | q[:, 2]
+    return np.bincount(idx, minlength=512)
+
+
+def _file_fingerprint(image: "Image.Image") -> Optional[tuple]:
+    """Cheap cache key for an image opened from disk, keyed by path and mtime."""
+    filename = getattr(image, "filename", None)
+    if filename:
+        try:
+            return ("file", filename, os.path.getmtime(filename), image.size, image.mode)
+        except OSError:
+            pass
+    return None
+
+
+def _analyze_image(image: "Image.Image") -> tuple[str, tuple[str, ...]]:
+    """Get (image_hash, dominant_colors) for an image, reusing earlier results."""
+    # In-memory images are keyed by the hash of the shared downsampled buffer
+    small = None
+    key = _file_fingerprint(image)
+    if key is None:
+        small = downsample_for_analysis(image)
+        key = ("pixels", compute_image_hash_from_arr(small))
+
+    with _image_analysis_cache_lock:
+        cached = _image_analysis_cache.get(key)
+        if cached is not None:
+            _image_analysis_cache.move_to_end(key)
+
+    if cached is None:
+        if small is None:
+            small = downsample_for_analysis(image)
+        # One conversion + resize feeds both the hash and the palette
+        image_hash = key[1] if key[0] == "pixels" else compute_image_hash_from_arr(small)
+        cached = (image_hash, tuple(extract_dominant_colors_from_arr(small)))
+        with _image_analysis_cache_lock:
+            _image_analysis_cache[key] = cached
+            while len(_image_analysis_cache) > IMAGE_ANALYSIS_CACHE_SIZE:
+                _image_analysis_cache.popitem(last=False)
+
+    return cached
 
 
 def create_profile(
-    anchor_image: Image.Image,
+    anchor_image: "Image.Image",
     user_notes: str = "",
     auto_detect: bool = True,
 ) -> CharacterProfile:
@@ -160,41 +350,45 @@ def create_profile(
     """
     logger.info("Creating character profile from anchor image")
 
-    profile = CharacterProfile(
-        user_notes=user_notes,
-        image_hash=compute_image_hash(anchor_image),
-        dominant_colors=extract_dominant_colors(anchor_image),
-    )
+    image_hash, dominant_colors = _analyze_image(anchor_image)
+
+    # The profile is frozen, so gather every derived trait before building it
+    traits = {}
 
     if auto_detect:
         # Placeholder for future ML-based feature detection
         # For now, we use sensible defaults that emphasize consistency
-        profile.do_not_change = [
+        traits["do_not_change"] = (
             "same face structure, expression style, and facial features",
             "same hairstyle, hair color, and hair texture",
             "same outfit, clothing colors, and style",
             "same body proportions and posture tendencies",
             "same accessories and distinguishing marks",
             "consistent lighting on the character across scenes",
-        ]
+        )
 
     # If user provided notes, parse them for key details
     if user_notes:
-        notes_lower = user_notes.lower()
-
-        # Simple keyword extraction
-        if any(w in notes_lower for w in ["male", "man", "boy", "he"]):
-            profile.gender_presentation = "male"
-        elif any(w in notes_lower for w in ["female", "woman", "girl", "she"]):
-            profile.gender_presentation = "female"
+        # Simple keyword extraction (whole words, so "female" is not "male")
+        if _NOTES_MALE.search(user_notes):
+            traits["gender_presentation"] = "male"
+        elif _NOTES_FEMALE.search(user_notes):
+            traits["gender_presentation"] = "female"
 
         # Age hints
-        if any(w in notes_lower for w in ["young", "teen", "teenager"]):
-            profile.age_range = "teenager"
-        elif any(w in notes_lower for w in ["adult", "middle-aged"]):
-            profile.age_range = "adult"
-        elif any(w in notes_lower for w in ["elderly", "old", "senior"]):
-            profile.age_range = "elderly"
+        if _NOTES_TEEN.search(user_notes):
+            traits["age_range"] = "teenager"
+        elif _NOTES_ADULT.search(user_notes):
+            traits["age_range"] = "adult"
+        elif _NOTES_ELDERLY.search(user_notes):
+            traits["age_range"] = "elderly"
+
+    profile = CharacterProfile(
+        user_notes=user_notes,
+        image_hash=image_hash,
+        dominant_colors=dominant_colors,
+        **traits,
+    )
 
     logger.info(f"Created profile with hash: {profile.image_hash[:8]}...")
     return profile
@@ -202,13 +396,11 @@ def create_profile(
 
 def save_profile(profile: CharacterProfile, path: Path) -> None:
     """Save a character profile to a JSON file."""
-    with open(path, "w") as f:
-        json.dump(profile.to_dict(), f, indent=2)
+    write_json(path, profile.to_dict())
 
 
 def load_profile(path: Path) -> Optional[CharacterProfile]:
     """Load a character profile from a JSON file."""
     if not path.exists():
         return None
-    with open(path) as f:
-        return CharacterProfile.from_dict(json.load(f))
+    return CharacterProfile.from_dict(read_json(path))
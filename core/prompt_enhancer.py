@@ -5,13 +5,47 @@ Converts user requests into SAFE, photorealistic image-generation prompts
 with strict character consistency using the TAL Anchor Image.
 """
 
+import asyncio
+import copy
+import hashlib
 import json
 import logging
 import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional
 
+from core.jsonio import parse_json
+
 logger = logging.getLogger(__name__)
 
+# Bump when the system prompt or output shape changes to invalidate cached results
+ENHANCER_VERSION = "2"
+
+# In-process LRU in front of the on-disk cache
+ENHANCE_CACHE_SIZE = 512
+_enhance_cache: "OrderedDict[str, dict]" = OrderedDict()
+_enhance_cache_lock = threading.Lock()
+
+# On-disk entries kept; the least recently used files are pruned on write
+ENHANCE_DISK_CACHE_MAX_FILES = 2048
+
+# Parallelism for the per-request fallback when a batched call fails
+ENHANCE_BATCH_WORKERS = 8
+
+# Terms every negative prompt suppresses; shared by the system prompt and the default
+_NEGATIVE_BASE_TOKENS = (
+    "cartoon", "anime", "illustration", "3d", "cgi", "render", "painting", "sketch", "comic",
+    "unreal engine", "pixar", "disney", "doll-like", "plastic skin", "oversharpened",
+    "extra limbs", "deformed face", "blurry", "watermark", "text", "logo", "brand marks",
+    "celebrity", "politician", "public figure",
+)
+NEGATIVE_PROMPT_BASE = ", ".join(_NEGATIVE_BASE_TOKENS)
+
 # System prompt for TAL Image Generator
 TAL_SYSTEM_PROMPT = """
 You are "TAL Image Prompt Builder": a strict prompt-enhancement layer that converts a user's request into a SAFE, photorealistic image-generation prompt.
@@ -74,17 +108,35 @@ DEFAULTS
 - Style baseline: "photorealistic, natural light, candid lifestyle photo, realistic skin texture, subtle depth of field"
 
 NEGATIVE PROMPT BASE (always include):
-"cartoon, anime, illustration, 3d, cgi, render, painting, sketch, comic, unreal engine, pixar, disney, doll-like, plastic skin, oversharpened, extra limbs, deformed face, blurry, watermark, text, logo, brand marks, celebrity, politician, public figure"
 """
+TAL_SYSTEM_PROMPT += f'"{NEGATIVE_PROMPT_BASE}"\n'
 
 # Default negative prompt
-DEFAULT_NEGATIVE_PROMPT = (
-    "cartoon, anime, illustration, 3d, cgi, render, painting, sketch, comic, "
-    "unreal engine, pixar, disney, doll-like, plastic skin, oversharpened, "
-    "extra limbs, deformed face, blurry, watermark, text, logo, brand marks, "
-    "celebrity, politician, public figure, deformed, bad anatomy, bad proportions"
+DEFAULT_NEGATIVE_PROMPT = sys.intern(
+    ", ".join(_NEGATIVE_BASE_TOKENS + ("deformed", "bad anatomy", "bad proportions"))
+)
+
+# Base TAL character prompt; the actual details come from the reference image
+TAL_CHARACTER_PROMPT = sys.intern(
+    "Photorealistic photograph of a person matching the reference image exactly, "
+    "same face, same features, same identity, natural lighting, "
+    "candid lifestyle photography style, 35mm lens, realistic skin texture, "
+    "subtle depth of field, high quality detailed photo"
 )
 
+# Scalar defaults for fields a parsed Gemini prompt package may leave out
+_RESULT_DEFAULTS = {
+    "negative_prompt": DEFAULT_NEGATIVE_PROMPT,
+    "reference_strength": 0.85,
+    "size": "1024x1024",
+    "n": 1,
+    "seed": None,
+}
+
+# Outermost JSON object / array in a model response (greedy, spans lines)
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+_JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+
 # Default style baseline
 DEFAULT_STYLE_BASELINE = (
     "photorealistic, natural light, candid lifestyle photo, realistic skin texture, "
@@ -108,6 +160,7 @@ class PromptEnhancer:
         self.api_key = api_key or os.environ.get("GOOGLE_API_KEY")
         self._client = None
         self._model = None
+        self._system_instruction = None
         logger.info(f"PromptEnhancer initialized (has_key={bool(self.api_key)})")
 
     def _init_model(self):
@@ -120,6 +173,8 @@ class PromptEnhancer:
 
             self._client = genai.Client(api_key=self.api_key)
             self._model = "gemini-2.0-flash"
+            # Sent as a system instruction so only the user message varies per call
+            self._system_instruction = TAL_SYSTEM_PROMPT
             logger.info("Gemini client initialized for prompt enhancement")
         except Exception as e:
             logger.error(f"Failed to initialize Gemini: {e}")
@@ -154,67 +209,78 @@ class PromptEnhancer:
             logger.warning("No API key, using basic enhancement")
             return self._basic_enhance(user_request)
 
+        key = _enhance_cache_key(user_request, style_preset, additional_context)
+        cached = _enhance_cache_get(key)
+        if cached is not None:
+            logger.info("Using cached prompt enhancement")
+            return cached
+
         try:
             self._init_model()
-            return self._gemini_enhance(user_request, additional_context)
+            result, parsed = self._gemini_enhance(user_request, additional_context)
         except Exception as e:
             logger.error(f"Gemini enhancement failed: {e}")
             return self._basic_enhance(user_request)
 
+        # A raw-text fallback is not cached, so one bad response isn't permanent
+        if not parsed:
+            return result
+        _enhance_cache_put(key, result)
+        return copy.deepcopy(result)
+
     def _gemini_enhance(
         self,
         user_request: str,
         additional_context: str,
-    ) -> dict:
+    ) -> tuple[dict, bool]:
         """Use Gemini to enhance the prompt following TAL system rules."""
+        response = self._client.models.generate_content(
+            model=self._model,
+            contents=_single_user_message(user_request, additional_context),
+            config=self._generate_config(max_output_tokens=1000),
+        )
+        return self._parse_single_response(response.text, user_request)
 
-        from google.genai.types import GenerateContentConfig
-
-        user_message = f"""User request: "{user_request}"
-
-Additional context: {additional_context if additional_context else "None"}
+    async def _gemini_enhance_async(
+        self,
+        user_request: str,
+        additional_context: str,
+    ) -> tuple[dict, bool]:
+        """Async variant of _gemini_enhance using the client's aio interface."""
+        response = await self._client.aio.models.generate_content(
+            model=self._model,
+            contents=_single_user_message(user_request, additional_context),
+            config=self._generate_config(max_output_tokens=1000),
+        )
+        return self._parse_single_response(response.text, user_request)
 
-Generate the JSON prompt package following the system rules exactly. Output ONLY valid JSON, no markdown."""
+    def _generate_config(self, max_output_tokens: int):
+        """Build the generation config shared by every enhancement call."""
+        from google.genai.types import GenerateContentConfig
 
-        response = self._client.models.generate_content(
-            model=self._model,
-            contents=f"{TAL_SYSTEM_PROMPT}\n\n{user_message}",
-            config=GenerateContentConfig(
-                temperature=0.7,
-                max_output_tokens=1000,
-            )
+        return GenerateContentConfig(
+            temperature=0.7,
+            max_output_tokens=max_output_tokens,
+            system_instruction=self._system_instruction,
         )
 
-        response_text = response.text.strip()
+    def _parse_single_response(self, response_text: str, user_request: str) -> tuple[dict, bool]:
+        """
+        Parse one prompt package, falling back to the raw text as the prompt.
 
-        # Try to parse JSON from response
-        try:
-            # Remove markdown code blocks if present
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-                response_text = response_text.strip()
-
-            result = json.loads(response_text)
-
-            # Ensure all required fields exist
-            result.setdefault("final_prompt", self._basic_enhance(user_request)["final_prompt"])
-            result.setdefault("negative_prompt", DEFAULT_NEGATIVE_PROMPT)
-            result.setdefault("reference_strength", 0.85)
-            result.setdefault("size", "1024x1024")
-            result.setdefault("n", 1)
-            result.setdefault("seed", None)
-            result.setdefault("assumptions", [])
-            result.setdefault("policy_notes", [])
-
-            # Add original for tracking
-            result["original"] = user_request
-            result["enhanced"] = result["final_prompt"]
+        Returns the result and whether it was parsed from JSON (False for the fallback).
+        """
+        response_text = response_text.strip()
 
-            return result
+        # Pull the outermost {...} block out of the response, ignoring any
+        # markdown fence or chatter around it
+        match = _JSON_OBJECT.search(response_text)
+        try:
+            if match is None:
+                raise ValueError("no JSON object in response")
+            return self._complete_result(parse_json(match.group(0)), user_request), True
 
-        except json.JSONDecodeError:
+        except ValueError:
             logger.warning(f"Failed to parse JSON response, using as raw prompt")
             return {
                 "original": user_request,
@@ -227,7 +293,50 @@ Generate the JSON prompt package following the system rules exactly. Output ONLY
                 "seed": None,
                 "assumptions": ["Could not parse structured response"],
                 "policy_notes": [],
-            }
+            }, False
+
+    def _gemini_enhance_batch(self, user_requests: list[str]) -> list[dict]:
+        """Use Gemini to enhance several prompts in a single request."""
+
+        numbered = "\n".join(f'{i}. "{req}"' for i, req in enumerate(user_requests, 1))
+        user_message = f"""Enhance each of these user requests:
+{numbered}
+
+Generate one JSON prompt package per request, following the system rules exactly.
+Return ONLY a JSON array of {len(user_requests)} objects in the same order, no markdown."""
+
+        response = self._client.models.generate_content(
+            model=self._model,
+            contents=user_message,
+            config=self._generate_config(max_output_tokens=1000 * len(user_requests)),
+        )
+
+        match = _JSON_ARRAY.search(response.text)
+        if match is None:
+            raise ValueError("No JSON array in batched response")
+        results = parse_json(match.group(0))
+        if not isinstance(results, list) or len(results) != len(user_requests):
+            raise ValueError(f"Expected a JSON array of {len(user_requests)} prompt packages")
+
+        return [
+            self._complete_result(result, req)
+            for result, req in zip(results, user_requests)
+        ]
+
+    def _complete_result(self, result: dict, user_request: str) -> dict:
+        """Fill in missing fields of a parsed Gemini prompt package."""
+        # Ensure all required fields exist; lists are created per result
+        result = {**_RESULT_DEFAULTS, **result}
+        if "final_prompt" not in result:
+            result["final_prompt"] = self._basic_enhance(user_request)["final_prompt"]
+        result.setdefault("assumptions", [])
+        result.setdefault("policy_notes", [])
+
+        # Add original for tracking
+        result["original"] = user_request
+        result["enhanced"] = result["final_prompt"]
+
+        return result
 
     def _basic_enhance(self, user_request: str) -> dict:
         """Basic enhancement without Gemini (fallback)."""
@@ -257,9 +366,181 @@ Generate the JSON prompt package following the system rules exactly. Output ONLY
         self,
         requests: list[str],
         style_preset: str = "default",
+        max_workers: int = ENHANCE_BATCH_WORKERS,
     ) -> list[dict]:
-        """Enhance multiple requests."""
-        return [self.enhance(req, style_preset) for req in requests]
+        """
+        Enhance multiple requests with one Gemini call.
+
+        Cached requests are served from the cache; the rest are sent together
+        as a numbered list. If the batched response cannot be used, the misses
+        are enhanced individually on up to max_workers threads instead.
+        Results are returned in request order.
+        """
+        if not self.api_key:
+            logger.warning("No API key, using basic enhancement")
+            return [self._basic_enhance(req) for req in requests]
+
+        keys = [_enhance_cache_key(req, style_preset, "") for req in requests]
+        results = [_enhance_cache_get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        pending = [requests[i] for i in missing]
+        try:
+            self._init_model()
+            enhanced = self._gemini_enhance_batch(pending)
+        except Exception as e:
+            logger.warning(f"Batched enhancement failed, enhancing individually: {e}")
+            workers = max(1, min(len(pending), max_workers))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                enhanced = list(executor.map(lambda req: self.enhance(req, style_preset), pending))
+        else:
+            for i, result in zip(missing, enhanced):
+                _enhance_cache_put(keys[i], result)
+            enhanced = [copy.deepcopy(result) for result in enhanced]
+
+        for i, result in zip(missing, enhanced):
+            results[i] = result
+        return results
+
+    async def enhance_batch_async(
+        self,
+        requests: list[str],
+        style_preset: str = "default",
+        max_concurrency: int = ENHANCE_BATCH_WORKERS,
+    ) -> list[dict]:
+        """
+        Enhance multiple requests concurrently with the async Gemini client.
+
+        Each request is its own call, at most max_concurrency in flight, and
+        results are returned in request order.
+        """
+        if not self.api_key:
+            logger.warning("No API key, using basic enhancement")
+            return [self._basic_enhance(req) for req in requests]
+
+        try:
+            self._init_model()
+        except Exception as e:
+            logger.error(f"Gemini enhancement failed: {e}")
+            return [self._basic_enhance(req) for req in requests]
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def enhance_one(user_request: str) -> dict:
+            key = _enhance_cache_key(user_request, style_preset, "")
+            cached = _enhance_cache_get(key)
+            if cached is not None:
+                return cached
+
+            try:
+                async with semaphore:
+                    result, parsed = await self._gemini_enhance_async(user_request, "")
+            except Exception as e:
+                logger.error(f"Gemini enhancement failed: {e}")
+                return self._basic_enhance(user_request)
+
+            if not parsed:
+                return result
+            _enhance_cache_put(key, result)
+            return copy.deepcopy(result)
+
+        return list(await asyncio.gather(*(enhance_one(req) for req in requests)))
+
+
+def _single_user_message(user_request: str, additional_context: str) -> str:
+    """Build the user message for a single enhancement request."""
+    return f"""User request: "{user_request}"
+
+Additional context: {additional_context if additional_context else "None"}
+
+Generate the JSON prompt package following the system rules exactly. Output ONLY valid JSON, no markdown."""
+
+
+def get_enhance_cache_dir() -> Path:
+    """Get the on-disk prompt enhancement cache directory from env or default."""
+    return Path(os.environ.get("ENHANCE_CACHE_DIR", "./.cache/enhance"))
+
+
+def _enhance_cache_key(user_request: str, style_preset: str, additional_context: str) -> str:
+    """Build an exact-match cache key for an enhancement request."""
+    raw = json.dumps([ENHANCER_VERSION, user_request, style_preset, additional_context])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _enhance_cache_get(key: str) -> Optional[dict]:
+    """Look up a cached enhancement in memory, then on disk."""
+    with _enhance_cache_lock:
+        if key in _enhance_cache:
+            _enhance_cache.move_to_end(key)
+            return copy.deepcopy(_enhance_cache[key])
+
+    path = get_enhance_cache_dir() / f"{key}.json"
+    if not path.exists():
+        return None
+    try:
+        with open(path) as f:
+            result = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable enhance cache entry {path}: {e}")
+        return None
+
+    # Refresh the mtime so pruning treats a disk hit as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    _enhance_cache_remember(key, result)
+    return copy.deepcopy(result)
+
+
+def _enhance_cache_put(key: str, result: dict) -> None:
+    """Store an enhancement in memory and on disk."""
+    _enhance_cache_remember(key, copy.deepcopy(result))
+
+    cache_dir = get_enhance_cache_dir()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(cache_dir / f"{key}.json", "w") as f:
+            json.dump(result, f)
+    except OSError as e:
+        logger.warning(f"Failed to write enhance cache entry: {e}")
+        return
+
+    _enhance_cache_prune(cache_dir)
+
+
+def _enhance_cache_prune(cache_dir: Path) -> None:
+    """Delete the least recently used disk entries past ENHANCE_DISK_CACHE_MAX_FILES."""
+    try:
+        entries = [
+            (entry.stat().st_mtime, entry.path)
+            for entry in os.scandir(cache_dir)
+            if entry.name.endswith(".json")
+        ]
+    except OSError as e:
+        logger.warning(f"Failed to scan enhance cache: {e}")
+        return
+
+    if len(entries) <= ENHANCE_DISK_CACHE_MAX_FILES:
+        return
+    entries.sort()
+    for _, path in entries[: len(entries) - ENHANCE_DISK_CACHE_MAX_FILES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Already removed by a concurrent prune
+
+
+def _enhance_cache_remember(key: str, result: dict) -> None:
+    """Insert into the in-memory LRU, evicting the oldest entry when full."""
+    with _enhance_cache_lock:
+        _enhance_cache[key] = result
+        _enhance_cache.move_to_end(key)
+        while len(_enhance_cache) > ENHANCE_CACHE_SIZE:
+            _enhance_cache.popitem(last=False)
 
 
 def get_tal_character_prompt() -> str:
@@ -267,12 +548,7 @@ def get_tal_character_prompt() -> str:
     Get the base TAL character prompt for photorealistic generation.
     The actual character details come from the reference image.
     """
-    return (
-        "Photorealistic photograph of a person matching the reference image exactly, "
-        "same face, same features, same identity, natural lighting, "
-        "candid lifestyle photography style, 35mm lens, realistic skin texture, "
-        "subtle depth of field, high quality detailed photo"
-    )
+    return TAL_CHARACTER_PROMPT
 
 
 def get_negative_prompt() -> str:
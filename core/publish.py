@@ -3,22 +3,27 @@ Publish Module for Tile Collage Studio.
 Handles exporting and publishing generated collages.
 """
 
-import json
 import logging
+import os
 import shutil
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+from core.jsonio import encode_jsonl, parse_json, write_json
 from core.storage import (
     collage_exists,
     get_collage_path,
+    get_io_pool,
     get_published_dir,
     load_metadata,
 )
 
 logger = logging.getLogger(__name__)
 
+# Block size for reading the publish index backwards
+TAIL_CHUNK_SIZE = 8192
+
 
 class PublishError(Exception):
     """Error during publishing."""
@@ -26,7 +31,51 @@ class PublishError(Exception):
     pass
 
 
-def publish(run_id: str) -> dict:
+class PublishWriter:
+    """
+    Keeps published_index.jsonl open across several publishes.
+
+    Bulk workflows should share one writer so the index is opened once and
+    the appends are buffered:
+
+        with PublishWriter() as writer:
+            for run_id in run_ids:
+                publish(run_id, writer=writer)
+    """
+
+    def __init__(self, index_path: Optional[Path] = None):
+        self.index_path = index_path or get_publish_index_path()
+        self._file = None
+
+    def __enter__(self) -> "PublishWriter":
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.index_path, "ab")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def append(self, record: dict) -> None:
+        """Buffer one publish record for the index."""
+        self._file.write(encode_jsonl(record))
+
+    def flush(self) -> None:
+        """Write buffered records to the index file."""
+        self._file.flush()
+
+    def close(self) -> None:
+        """Flush and close the index file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def get_publish_index_path() -> Path:
+    """Get the path to the publish index."""
+    return get_published_dir() / "published_index.jsonl"
+
+
+def publish(run_id: str, writer: Optional[PublishWriter] = None) -> dict:
     """
     Publish a generated collage.
 
@@ -36,6 +85,7 @@ def publish(run_id: str) -> dict:
 
     Args:
         run_id: The run ID of the collage to publish
+        writer: Optional open PublishWriter to append the index entry through
 
     Returns:
         Dictionary with publish info including the path
@@ -43,6 +93,85 @@ def publish(run_id: str) -> dict:
     Raises:
         PublishError: If collage doesn't exist or publish fails
     """
+    return publish_many([run_id], writer=writer)[0]
+
+
+def publish_many(
+    run_ids: list[str],
+    writer: Optional[PublishWriter] = None,
+) -> list[dict]:
+    """
+    Publish several collages, overlapping the file copies.
+
+    Copies run on the shared storage I/O pool; the index entries for every
+    successful copy are then appended in one buffered write.
+
+    Args:
+        run_ids: The run IDs of the collages to publish
+        writer: Optional open PublishWriter to append the index entries through
+
+    Returns:
+        List of publish info dictionaries, in run_ids order
+
+    Raises:
+        PublishError: If any collage doesn't exist or fails to copy. Entries
+            for the runs that did publish are still added to the index.
+    """
+    if len(run_ids) == 1:
+        outcomes = [_try_copy_for_publish(run_ids[0])]
+    else:
+        outcomes = list(get_io_pool().map(_try_copy_for_publish, run_ids))
+
+    records = [record for record, _ in outcomes if record is not None]
+
+    # Append to index
+    if records:
+        try:
+            if writer is not None:
+                for record in records:
+                    writer.append(record)
+            else:
+                with PublishWriter() as batch:
+                    for record in records:
+                        batch.append(record)
+            logger.info(f"Added {len(records)} entries to publish index")
+        except Exception as e:
+            logger.warning(f"Failed to update publish index: {e}")
+
+    for _, error in outcomes:
+        if error is not None:
+            raise error
+
+    return [
+        {
+            "success": True,
+            "run_id": record["run_id"],
+            "published_path": record["published_path"],
+            "published_at": record["published_at"],
+        }
+        for record, _ in outcomes
+    ]
+
+
+def _try_copy_for_publish(run_id: str) -> tuple[Optional[dict], Optional[PublishError]]:
+    """
+    Run _copy_for_publish, returning its error instead of raising it.
+
+    Any failure (e.g. mkdir or unreadable metadata) is returned as a PublishError,
+    so one bad run can't discard the index entries of the runs that did copy.
+    """
+    try:
+        return _copy_for_publish(run_id), None
+    except PublishError as e:
+        return None, e
+    except Exception as e:
+        error = PublishError(f"Failed to publish run {run_id}: {e}")
+        error.__cause__ = e
+        return None, error
+
+
+def _copy_for_publish(run_id: str) -> dict:
+    """Copy one collage into the published directory and build its index record."""
     logger.info(f"Publishing collage for run: {run_id}")
 
     # Validate collage exists
@@ -51,19 +180,22 @@ def publish(run_id: str) -> dict:
 
     source_path = get_collage_path(run_id)
 
+    # One timestamp for the directory, filename and record, so they always agree
+    now = datetime.now()
+
     # Create date-based publish directory
-    today = datetime.now().strftime("%Y-%m-%d")
+    today = now.strftime("%Y-%m-%d")
     publish_dir = get_published_dir() / today
     publish_dir.mkdir(parents=True, exist_ok=True)
 
     # Generate unique filename
-    timestamp = datetime.now().strftime("%H%M%S")
+    timestamp = now.strftime("%H%M%S")
     dest_filename = f"collage_{run_id}_{timestamp}.png"
     dest_path = publish_dir / dest_filename
 
     # Copy the collage
     try:
-        shutil.copy2(source_path, dest_path)
+        shutil.copyfile(source_path, dest_path)
         logger.info(f"Copied collage to: {dest_path}")
     except Exception as e:
         raise PublishError(f"Failed to copy collage: {e}")
@@ -72,30 +204,14 @@ def publish(run_id: str) -> dict:
     metadata = load_metadata(run_id) or {}
 
     # Create publish record
-    publish_record = {
+    return {
         "run_id": run_id,
-        "published_at": datetime.now().isoformat(),
+        "published_at": now.isoformat(),
         "source_path": str(source_path),
         "published_path": str(dest_path),
         "original_metadata": metadata,
     }
 
-    # Append to index
-    index_path = get_published_dir() / "published_index.jsonl"
-    try:
-        with open(index_path, "a") as f:
-            f.write(json.dumps(publish_record) + "\n")
-        logger.info(f"Added entry to publish index")
-    except Exception as e:
-        logger.warning(f"Failed to update publish index: {e}")
-
-    return {
-        "success": True,
-        "run_id": run_id,
-        "published_path": str(dest_path),
-        "published_at": publish_record["published_at"],
-    }
-
 
 def get_published_history(limit: int = 50) -> list[dict]:
     """
@@ -107,25 +223,51 @@ def get_published_history(limit: int = 50) -> list[dict]:
     Returns:
         List of publish records, newest first
     """
-    index_path = get_published_dir() / "published_index.jsonl"
+    index_path = get_publish_index_path()
 
     if not index_path.exists():
         return []
 
-    records = []
     try:
-        with open(index_path) as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    records.append(json.loads(line))
+        # Only the newest `limit` lines are read and parsed
+        return [parse_json(line) for line in _tail_lines(index_path, limit)]
     except Exception as e:
         logger.error(f"Failed to read publish index: {e}")
         return []
 
-    # Return newest first
-    records.reverse()
-    return records[:limit]
+
+def _tail_lines(path: Path, count: int) -> list[bytes]:
+    """
+    Read the last `count` non-empty lines of a file, newest first.
+
+    Reads backwards in fixed-size chunks so the cost depends on `count`,
+    not on the size of the file.
+    """
+    lines = []
+    if count <= 0:
+        return lines
+
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        partial = b""
+        while pos > 0 and len(lines) < count:
+            size = min(TAIL_CHUNK_SIZE, pos)
+            pos -= size
+            f.seek(pos)
+            parts = (f.read(size) + partial).split(b"\n")
+            # The first piece may be the tail of a line that starts earlier
+            partial = parts[0]
+            for line in reversed(parts[1:]):
+                line = line.strip()
+                if line:
+                    lines.append(line)
+                    if len(lines) == count:
+                        return lines
+
+    partial = partial.strip()
+    if partial:
+        lines.append(partial)
+    return lines
 
 
 def publish_to_telegram(
@@ -184,9 +326,11 @@ def export_for_sharing(run_id: str, output_path: Optional[Path] = None) -> Path:
     if not collage_exists(run_id):
         raise PublishError(f"No collage found for run_id: {run_id}")
 
+    now = datetime.now()
+
     # Create export directory
     if output_path is None:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
         output_path = Path(f"./exports/collage_{timestamp}")
 
     output_path.mkdir(parents=True, exist_ok=True)
@@ -194,14 +338,13 @@ def export_for_sharing(run_id: str, output_path: Optional[Path] = None) -> Path:
     # Copy collage
     source_collage = get_collage_path(run_id)
     dest_collage = output_path / "collage.png"
-    shutil.copy2(source_collage, dest_collage)
+    shutil.copyfile(source_collage, dest_collage)
 
     # Copy/create metadata
     metadata = load_metadata(run_id) or {"run_id": run_id}
-    metadata["exported_at"] = datetime.now().isoformat()
+    metadata["exported_at"] = now.isoformat()
 
-    with open(output_path / "metadata.json", "w") as f:
-        json.dump(metadata, f, indent=2)
+    write_json(output_path / "metadata.json", metadata)
 
     logger.info(f"Exported to: {output_path}")
     return output_path
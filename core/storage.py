@@ -3,15 +3,38 @@ Storage utilities for Tile Collage Studio.
 Handles file I/O, directory management, and metadata persistence.
 """
 
-import json
 import os
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Optional
 
 from PIL import Image
 
+from core.jsonio import read_json, write_json
+
+# PNG zlib levels: fast for intermediate panels, Pillow's default for the final collage
+PANEL_COMPRESS_LEVEL = 1
+COLLAGE_COMPRESS_LEVEL = 6
+
+# Shared pool for image encodes/writes; Pillow releases the GIL while encoding PNGs
+IO_POOL_WORKERS = 4
+_io_pool: Optional[ThreadPoolExecutor] = None
+_io_pool_lock = threading.Lock()
+
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Get the process-wide thread pool used for parallel image writes."""
+    global _io_pool
+    with _io_pool_lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(
+                max_workers=IO_POOL_WORKERS, thread_name_prefix="storage-io"
+            )
+        return _io_pool
+
 
 def get_output_dir() -> Path:
     """Get the base output directory from env or default."""
@@ -43,16 +66,21 @@ def ensure_run_dir(run_id: str) -> Path:
     return run_dir
 
 
-def save_image(image: Image.Image, path: Path) -> Path:
-    """Save a PIL Image to the specified path."""
+def save_image(image: Image.Image, path: Path, compress_level: int = PANEL_COMPRESS_LEVEL) -> Path:
+    """Save a PIL Image to the specified path as PNG at the given zlib level."""
     path.parent.mkdir(parents=True, exist_ok=True)
-    image.save(path, "PNG")
+    image.save(path, "PNG", compress_level=compress_level, optimize=False)
     return path
 
 
 def load_image(path: Path) -> Image.Image:
     """Load an image from path."""
-    return Image.open(path).convert("RGBA")
+    image = Image.open(path)
+    if image.mode != "RGBA":
+        return image.convert("RGBA")
+    # Already RGBA: just decode (and release the file) instead of copying
+    image.load()
+    return image
 
 
 def save_metadata(run_id: str, metadata: dict[str, Any]) -> Path:
@@ -66,8 +94,7 @@ def save_metadata(run_id: str, metadata: dict[str, Any]) -> Path:
     if "run_id" not in metadata:
         metadata["run_id"] = run_id
 
-    with open(metadata_path, "w") as f:
-        json.dump(metadata, f, indent=2)
+    write_json(metadata_path, metadata)
 
     return metadata_path
 
@@ -77,22 +104,36 @@ def load_metadata(run_id: str) -> Optional[dict[str, Any]]:
     metadata_path = get_run_dir(run_id) / "metadata.json"
     if not metadata_path.exists():
         return None
-    with open(metadata_path) as f:
-        return json.load(f)
+    return read_json(metadata_path)
 
 
 def save_collage(run_id: str, collage: Image.Image) -> Path:
     """Save the final collage image."""
     run_dir = ensure_run_dir(run_id)
     collage_path = run_dir / "collage.png"
-    return save_image(collage, collage_path)
+    return save_image(collage, collage_path, compress_level=COLLAGE_COMPRESS_LEVEL)
+
+
+def get_panel_path(run_id: str, panel_index: int) -> Path:
+    """Get the path of an individual panel image."""
+    return get_run_dir(run_id) / "panels" / f"panel_{panel_index:02d}.png"
 
 
 def save_panel(run_id: str, panel_index: int, panel: Image.Image) -> Path:
     """Save an individual panel image."""
-    run_dir = ensure_run_dir(run_id)
-    panel_path = run_dir / "panels" / f"panel_{panel_index:02d}.png"
-    return save_image(panel, panel_path)
+    ensure_run_dir(run_id)
+    panel_path = get_panel_path(run_id, panel_index)
+    return save_image(panel, panel_path, compress_level=PANEL_COMPRESS_LEVEL)
+
+
+def save_panel_pngs(run_id: str, panel_pngs: list[bytes]) -> list[Path]:
+    """Write already-encoded panel PNGs as-is, returning paths in panel order."""
+    ensure_run_dir(run_id)
+    paths = [get_panel_path(run_id, i) for i in range(len(panel_pngs))]
+    for path, png in zip(paths, panel_pngs):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(png)
+    return paths
 
 
 def collage_exists(run_id: str) -> bool:
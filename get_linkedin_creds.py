@@ -6,6 +6,7 @@ Usage: python get_linkedin_creds.py
 """
 
 import http.server
+import threading
 import urllib.parse
 import webbrowser
 import requests
@@ -28,6 +29,11 @@ class CallbackHandler(http.server.BaseHTTPRequestHandler):
     def do_GET(self):
         # Parse the callback URL
         parsed = urllib.parse.urlparse(self.path)
+        if parsed.path != "/callback":
+            # Favicons, prefetches, etc. - not the OAuth redirect
+            self.send_error(404)
+            return
+
         params = urllib.parse.parse_qs(parsed.query)
 
         if "code" in params:
@@ -108,8 +114,9 @@ LINKEDIN_USER_URN={user_urn}
             print(f"\n❌ Error: {error} - {error_desc}")
             self.send_error(400, f"Error: {error}")
 
-        # Shutdown server after handling
-        self.server.should_stop = True
+        # Shutdown server after handling; shutdown() blocks until serve_forever
+        # returns, so it must run off the request thread
+        threading.Thread(target=self.server.shutdown).start()
 
     def log_message(self, format, *args):
         pass  # Suppress default logging
@@ -135,16 +142,15 @@ def main():
     print("3. Authorize the app")
     print("\nWaiting for authorization...\n")
 
-    # Start local server
-    server = http.server.HTTPServer(("localhost", 8888), CallbackHandler)
-    server.should_stop = False
+    # Start local server (threaded, so a keep-alive favicon request can't block the callback)
+    server = http.server.ThreadingHTTPServer(("localhost", 8888), CallbackHandler)
 
     # Open browser
     webbrowser.open(auth_url)
 
-    # Handle one request
-    while not server.should_stop:
-        server.handle_request()
+    # Serve until the callback handler shuts the server down
+    with server:
+        server.serve_forever()
 
     print("\nDone! You can now add the credentials to Render.")
 
@@ -4,7 +4,7 @@ Cabal of Strangers - Streamlit Frontend
 Full workflow: Prompt Enhancement → Image Generation with TAL reference → Instagram Posting
 """
 
-from typing import Optional, Tuple
+from typing import Optional, Tuple, Union
 import json
 import os
 import requests
@@ -12,11 +12,20 @@ import streamlit as st
 from pathlib import Path
 from io import BytesIO
 from datetime import datetime
-import base64
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from PIL import Image
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from google import genai  # Optional: only Nano Banana generation needs it
+    from google.genai import types
+except ImportError:
+    genai = None
+    types = None
 
 # Load environment variables
 load_dotenv()
@@ -31,6 +40,25 @@ INSTAGRAM_BUSINESS_ACCOUNT_ID = os.environ.get("INSTAGRAM_BUSINESS_ACCOUNT_ID")
 GRAPH_API_VERSION = "v19.0"
 GRAPH_API_BASE = f"https://graph.facebook.com/{GRAPH_API_VERSION}"
 
+# Longest edge kept for uploaded reference images; Gemini gains nothing from phone-camera resolution
+REFERENCE_MAX_SIZE = (1024, 1024)
+
+# Widest image uploaded for Instagram, which displays at most 1080px across
+INSTAGRAM_MAX_WIDTH = 1080
+
+# JPEG quality for the Instagram-bound copy; Instagram re-encodes uploads anyway
+INSTAGRAM_JPEG_QUALITY = 85
+
+# Opt-in: start uploading each finished image to the public host as soon as it
+# renders, so posting skips the upload. Off by default, as it publishes every
+# generated image to imgur whether or not it is ever posted.
+INSTAGRAM_PREHOST = os.environ.get("INSTAGRAM_PREHOST", "").lower() in ("1", "true", "yes")
+
+# Media container readiness polling (0.25s first wait, growing 1.6x, ~11s at most)
+CONTAINER_POLL_ATTEMPTS = 8
+CONTAINER_POLL_INITIAL_DELAY = 0.25
+CONTAINER_POLL_BACKOFF = 1.6
+
 # LinkedIn API Configuration
 LINKEDIN_CLIENT_ID = os.environ.get("LINKEDIN_CLIENT_ID")
 LINKEDIN_CLIENT_SECRET = os.environ.get("LINKEDIN_CLIENT_SECRET")
@@ -43,6 +71,62 @@ LINKEDIN_API_BASE = "https://api.linkedin.com/v2"
 LINKEDIN_ACCESS_TOKEN = os.environ.get("LINKEDIN_ACCESS_TOKEN")
 LINKEDIN_USER_URN = os.environ.get("LINKEDIN_USER_URN")
 
+# zlib level for PNGs encoded in the app (downloads, LinkedIn uploads); 1 is ~3-4x faster than the default 6
+PNG_COMPRESS_LEVEL = 1
+
+# JPEG quality for the TAL reference sent with every Gemini request (the PNG is ~1.5 MB)
+TAL_REFERENCE_JPEG_QUALITY = 88
+
+# Background uploads of finished images to the Instagram image host
+UPLOAD_POOL_WORKERS = 4
+
+# How long a seeded /run result is reused for identical inputs
+ENHANCED_PROMPT_CACHE_TTL = 24 * 60 * 60
+
+# Gemini aspect ratio for each supported "WxH" size
+ASPECT_RATIOS = {
+    "1024x1024": "1:1",
+    "1080x1080": "1:1",
+    "1920x1080": "16:9",
+    "1080x1920": "9:16",
+    "1024x768": "4:3",
+}
+
+# (width/height, label) for sizes not in ASPECT_RATIOS; matched within 0.1
+ASPECT_RATIO_BUCKETS = (
+    (9 / 16, "9:16"),
+    (1.0, "1:1"),
+    (4 / 3, "4:3"),
+    (16 / 9, "16:9"),
+)
+
+# Photoreal mascot prompt sent with the TAL reference; only the scene and optional note vary
+PHOTOREAL_PROMPT_TEMPLATE = """Photorealistic lifestyle photograph of TAL, a 3D mascot character, in a real-world location.
+
+CHARACTER LOCK (identity must match reference image exactly):
+- TAL character must match TAL_ANCHOR_IMAGE exactly
+- Same fur color palette (orange/golden with cream markings)
+- Same facial proportions, eye style, muzzle shape
+- Same outfit vibe: beige t-shirt, dark brown vest, black pants, orange sneakers, black smartwatch
+
+Scene: {scene}
+
+PHOTOGRAPHY STYLE:
+- Real-world location with natural lighting + realistic shadows
+- Shot on DSLR, 35mm lens, shallow depth of field, subtle film grain
+- High-end brand mascot photography feel (like a real mascot photographed on location)
+- Realistic textures: detailed fur, fabric weave, natural shadow falloff
+- NOT a cartoon frame or animated movie still - this should look like a REAL photograph of a mascot{additional_ref_note}"""
+ADDITIONAL_REFERENCE_NOTE = "\n\nADDITIONAL REFERENCE: Use the second reference image for scene/style inspiration while keeping TAL's identity from the first reference."
+
+# Suffixes appended to the prompt for each extra image in a batch
+PROMPT_VARIANT_SUFFIXES = (
+    "",
+    " Close-up composition.",
+    " Wide angle view.",
+    " Dynamic side angle.",
+)
+
 # App Authentication (format: "user1:pass1,user2:pass2,user3:pass3")
 APP_USERS_RAW = os.environ.get("APP_USERS", "")
 
@@ -135,23 +219,136 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """
+    Get the shared HTTP session for the backend, image host, Graph and LinkedIn APIs.
+
+    Cached as a resource so keep-alive connections survive Streamlit reruns.
+    Only idempotent methods are retried, so posts are never sent twice.
+    """
+    retry = Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@st.cache_resource
+def get_genai_client(api_key: str):
+    """Get a Gemini client shared across reruns and concurrent image requests."""
+    if genai is None:
+        raise ImportError("google-genai is not installed; run: pip install google-genai")
+    return genai.Client(api_key=api_key)
+
+
+@st.cache_resource
+def get_upload_pool() -> ThreadPoolExecutor:
+    """Get the background pool that pre-hosts generated images for Instagram."""
+    return ThreadPoolExecutor(max_workers=UPLOAD_POOL_WORKERS, thread_name_prefix="upload")
+
+
+def _tal_image_stamp() -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of TAL's reference image, or None if it is missing."""
+    try:
+        stat = TAL_IMAGE_PATH.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@st.cache_resource(max_entries=1)
+def _load_tal_image(stamp: Tuple[int, int]) -> Image.Image:
+    return Image.open(TAL_IMAGE_PATH).convert("RGBA")
+
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def _encode_tal_jpeg(stamp: Tuple[int, int]) -> bytes:
+    # Flatten transparency onto white; JPEG has no alpha
+    image = _load_tal_image(stamp)
+    flattened = Image.new("RGB", image.size, (255, 255, 255))
+    flattened.paste(image, mask=image.getchannel("A"))
+    buffer = BytesIO()
+    flattened.save(buffer, format="JPEG", quality=TAL_REFERENCE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
 def load_tal_image():
-    """Load TAL's reference image."""
-    if TAL_IMAGE_PATH.exists():
-        return Image.open(TAL_IMAGE_PATH).convert("RGBA")
-    return None
+    """Load TAL's reference image, decoded once until the file changes."""
+    stamp = _tal_image_stamp()
+    return _load_tal_image(stamp) if stamp else None
+
+
+def load_tal_jpeg_bytes() -> Optional[bytes]:
+    """TAL's reference image as JPEG bytes for Gemini, encoded once until the file changes."""
+    stamp = _tal_image_stamp()
+    return _encode_tal_jpeg(stamp) if stamp else None
 
 
+def load_reference_upload(uploaded_file) -> Image.Image:
+    """
+    Decode an uploaded reference image, downscaled to REFERENCE_MAX_SIZE.
+
+    The result is kept in session state per file, so reruns don't re-decode it.
+    """
+    key = (uploaded_file.name, uploaded_file.size)
+    if st.session_state.get("ref_image_key") != key:
+        ref_image = Image.open(uploaded_file)
+        # thumbnail() lets JPEG decode straight at reduced scale
+        ref_image.thumbnail(REFERENCE_MAX_SIZE, Image.Resampling.LANCZOS)
+        st.session_state.ref_image = ref_image.convert("RGB")
+        st.session_state.ref_image_key = key
+    return st.session_state.ref_image
+
+
+@st.cache_data(ttl=5, show_spinner=False)
 def check_backend_health():
-    """Check if the backend server is running."""
+    """Check if the backend server is running (cached briefly so reruns don't re-ping it)."""
     try:
-        response = requests.get(f"{BACKEND_URL}/health", timeout=2)
+        response = get_http_session().get(f"{BACKEND_URL}/health", timeout=2)
         return response.json()
     except requests.exceptions.RequestException:
         return None
 
 
+class _EnhancementFailed(Exception):
+    """Carries a non-ok /run response out of the cache so it isn't stored."""
+
+    def __init__(self, result: dict):
+        super().__init__(result.get("error"))
+        self.result = result
+
+
+@st.cache_data(ttl=ENHANCED_PROMPT_CACHE_TTL, max_entries=64, show_spinner=False)
+def _get_seeded_enhanced_prompt(user_request: str, size: str, seed: int, style_preset: Optional[str]):
+    result = _request_enhanced_prompt(user_request, size, seed, style_preset)
+    if result.get("status") != "ok":
+        raise _EnhancementFailed(result)
+    return result
+
+
 def get_enhanced_prompt(user_request: str, size: str, seed: Optional[int], style_preset: Optional[str]):
+    """
+    Get an enhanced prompt from the backend.
+
+    A seed asks for a reproducible result, so successful seeded results are
+    cached by their inputs; unseeded requests always go to the backend for a
+    fresh take.
+    """
+    if seed is None:
+        return _request_enhanced_prompt(user_request, size, seed, style_preset)
+    try:
+        return _get_seeded_enhanced_prompt(user_request, size, seed, style_preset)
+    except _EnhancementFailed as e:
+        return e.result
+
+
+def _request_enhanced_prompt(user_request: str, size: str, seed: Optional[int], style_preset: Optional[str]):
     """Call the backend /run endpoint to get enhanced prompt."""
     payload = {
         "user_request": user_request,
@@ -160,7 +357,7 @@ def get_enhanced_prompt(user_request: str, size: str, seed: Optional[int], style
         "style_preset": style_preset,
     }
 
-    response = requests.post(
+    response = get_http_session().post(
         f"{BACKEND_URL}/run",
         json=payload,
         timeout=60,
@@ -168,16 +365,15 @@ def get_enhanced_prompt(user_request: str, size: str, seed: Optional[int], style
     return response.json()
 
 
-def image_to_base64(img: Image.Image) -> str:
-    """Convert PIL Image to base64 string."""
-    import base64
+@st.cache_data(max_entries=32, show_spinner=False)
+def png_bytes(img: Image.Image) -> bytes:
+    """Encode a PIL Image as PNG once; reruns and other callers reuse the bytes."""
     buffer = BytesIO()
     # Convert to RGB if RGBA
     if img.mode == "RGBA":
         img = img.convert("RGB")
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    return base64.b64encode(buffer.read()).decode("utf-8")
+    img.save(buffer, format="PNG", optimize=False, compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
 
 
 def generate_image_with_openai(prompt: str, size: str, reference_image: Image.Image) -> Tuple[Optional[Image.Image], Optional[str]]:
@@ -226,7 +422,7 @@ PHOTOGRAPHY STYLE:
 
         # Get image URL and download
         image_url = response.data[0].url
-        img_response = requests.get(image_url, timeout=60)
+        img_response = get_http_session().get(image_url, timeout=60)
         if img_response.status_code == 200:
             pil_image = Image.open(BytesIO(img_response.content)).convert("RGB")
             return pil_image, None
@@ -237,55 +433,39 @@ PHOTOGRAPHY STYLE:
         return None, str(e)
 
 
-def generate_image_with_nano_banana(prompt: str, negative_prompt: str, size: str, reference_image: Image.Image, additional_reference: Optional[Image.Image] = None):
-    """Generate image using Nano Banana Pro (Gemini 3 Pro Image) with reference image."""
-    try:
-        from google import genai
-        from google.genai import types
+def _nearest_aspect_ratio(size: str) -> str:
+    """Aspect ratio for a "WxH" size missing from ASPECT_RATIOS."""
+    width, height = map(int, size.split("x"))
+    ratio = width / height
+    bucket_ratio, label = min(ASPECT_RATIO_BUCKETS, key=lambda bucket: abs(bucket[0] - ratio))
+    return label if abs(bucket_ratio - ratio) < 0.1 else "1:1"
+
+
+def generate_image_with_nano_banana(prompt: str, negative_prompt: str, size: str, reference_image: Union[Image.Image, bytes], additional_reference: Optional[Image.Image] = None):
+    """
+    Generate image using Nano Banana Pro (Gemini 3 Pro Image) with reference image.
 
+    reference_image may be given as JPEG bytes to send them without re-encoding.
+    """
+    try:
         api_key = os.environ.get("GOOGLE_API_KEY")
         if not api_key:
             return None, "No GOOGLE_API_KEY found"
 
-        client = genai.Client(api_key=api_key)
+        client = get_genai_client(api_key)
 
         # Determine aspect ratio from size
-        width, height = map(int, size.split("x"))
-        ratio = width / height
-        if abs(ratio - 1.0) < 0.1:
-            aspect_ratio = "1:1"
-        elif abs(ratio - 16/9) < 0.1:
-            aspect_ratio = "16:9"
-        elif abs(ratio - 9/16) < 0.1:
-            aspect_ratio = "9:16"
-        elif abs(ratio - 4/3) < 0.1:
-            aspect_ratio = "4:3"
-        else:
-            aspect_ratio = "1:1"
+        aspect_ratio = ASPECT_RATIOS.get(size) or _nearest_aspect_ratio(size)
 
         # Build prompt with photoreal mascot style and character reference
-        additional_ref_note = ""
-        if additional_reference:
-            additional_ref_note = "\n\nADDITIONAL REFERENCE: Use the second reference image for scene/style inspiration while keeping TAL's identity from the first reference."
-
-        full_prompt = f"""Photorealistic lifestyle photograph of TAL, a 3D mascot character, in a real-world location.
-
-CHARACTER LOCK (identity must match reference image exactly):
-- TAL character must match TAL_ANCHOR_IMAGE exactly
-- Same fur color palette (orange/golden with cream markings)
-- Same facial proportions, eye style, muzzle shape
-- Same outfit vibe: beige t-shirt, dark brown vest, black pants, orange sneakers, black smartwatch
-
-Scene: {prompt}
-
-PHOTOGRAPHY STYLE:
-- Real-world location with natural lighting + realistic shadows
-- Shot on DSLR, 35mm lens, shallow depth of field, subtle film grain
-- High-end brand mascot photography feel (like a real mascot photographed on location)
-- Realistic textures: detailed fur, fabric weave, natural shadow falloff
-- NOT a cartoon frame or animated movie still - this should look like a REAL photograph of a mascot{additional_ref_note}"""
+        full_prompt = PHOTOREAL_PROMPT_TEMPLATE.format(
+            scene=prompt,
+            additional_ref_note=ADDITIONAL_REFERENCE_NOTE if additional_reference else "",
+        )
 
         # Build contents list with reference images
+        if isinstance(reference_image, bytes):
+            reference_image = types.Part.from_bytes(data=reference_image, mime_type="image/jpeg")
         contents = [full_prompt, reference_image]
         if additional_reference:
             contents.append(additional_reference)
@@ -296,6 +476,7 @@ PHOTOGRAPHY STYLE:
             contents=contents,
             config=types.GenerateContentConfig(
                 response_modalities=["TEXT", "IMAGE"],
+                image_config=types.ImageConfig(aspect_ratio=aspect_ratio),
             )
         )
 
@@ -318,12 +499,13 @@ def save_outputs(run_id: str, images: list, prompt_package: dict):
     output_dir = Path(f"outputs/runs/{run_id}")
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Save images
-    image_paths = []
-    for i, img in enumerate(images):
-        img_path = output_dir / f"generated_{i}.png"
-        img.save(img_path)
-        image_paths.append(str(img_path))
+    # Save images in parallel (Pillow releases the GIL while encoding); the saved
+    # files are what the results grid displays and offers for download
+    img_paths = [output_dir / f"generated_{i}.png" for i in range(len(images))]
+    if images:
+        with ThreadPoolExecutor(max_workers=min(4, len(images))) as executor:
+            list(executor.map(lambda path, img: path.write_bytes(png_bytes(img)), img_paths, images))
+    image_paths = [str(path) for path in img_paths]
 
     # Save prompt package
     with open(output_dir / "prompt_package.json", "w") as f:
@@ -339,27 +521,35 @@ def check_instagram_configured() -> bool:
     return bool(INSTAGRAM_ACCESS_TOKEN and INSTAGRAM_BUSINESS_ACCOUNT_ID)
 
 
+def cancel_hosted_uploads() -> None:
+    """Cancel background uploads of the previous run that haven't started yet."""
+    for upload in st.session_state.get("hosted_uploads") or []:
+        if upload is not None:
+            upload.cancel()
+
+
 def upload_image_to_hosting(img: Image.Image) -> Tuple[Optional[str], Optional[str]]:
     """Upload image to imgur for hosting (required by Instagram API)."""
     try:
-        # Convert image to base64
+        # Instagram displays at most 1080px wide; don't upload more than that
+        if img.width > INSTAGRAM_MAX_WIDTH:
+            height = round(img.height * INSTAGRAM_MAX_WIDTH / img.width)
+            img = img.resize((INSTAGRAM_MAX_WIDTH, height), Image.Resampling.LANCZOS)
+
+        # Encode as JPEG and send the raw bytes (multipart) rather than base64
         buffer = BytesIO()
         if img.mode == "RGBA":
             img = img.convert("RGB")
-        img.save(buffer, format="JPEG", quality=95)
-        buffer.seek(0)
-        img_base64 = base64.b64encode(buffer.read()).decode("utf-8")
+        img.save(buffer, format="JPEG", quality=INSTAGRAM_JPEG_QUALITY, optimize=True, progressive=True)
 
         # Use imgur API (anonymous upload)
-        response = requests.post(
+        response = get_http_session().post(
             "https://api.imgur.com/3/image",
             headers={
                 "Authorization": "Client-ID 546c25a59c58ad7",
             },
-            data={
-                "image": img_base64,
-                "type": "base64",
-            },
+            data={"type": "file"},
+            files={"image": ("image.jpg", buffer.getvalue(), "image/jpeg")},
             timeout=60,
         )
 
@@ -378,7 +568,7 @@ def upload_image_to_hosting(img: Image.Image) -> Tuple[Optional[str], Optional[s
 def create_instagram_media_container(image_url: str, caption: str) -> Tuple[Optional[str], Optional[str]]:
     """Create an Instagram media container."""
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{GRAPH_API_BASE}/{INSTAGRAM_BUSINESS_ACCOUNT_ID}/media",
             params={
                 "image_url": image_url,
@@ -400,13 +590,44 @@ def create_instagram_media_container(image_url: str, caption: str) -> Tuple[Opti
         return None, str(e)
 
 
+def wait_for_instagram_container(container_id: str) -> Optional[str]:
+    """Poll the container's status_code until FINISHED; returns an error message, or None when ready."""
+    backoff = CONTAINER_POLL_INITIAL_DELAY
+    for attempt in range(CONTAINER_POLL_ATTEMPTS):
+        response = get_http_session().get(
+            f"{GRAPH_API_BASE}/{container_id}",
+            params={
+                "fields": "status_code",
+                "access_token": INSTAGRAM_ACCESS_TOKEN,
+            },
+            timeout=30,
+        )
+        data = response.json()
+
+        if "error" in data:
+            return data["error"].get("message", "Unknown error")
+        status_code = data.get("status_code")
+        if status_code == "FINISHED":
+            return None
+        if status_code in ("ERROR", "EXPIRED"):
+            return f"Container status {status_code}"
+
+        # No point sleeping after the last check
+        if attempt < CONTAINER_POLL_ATTEMPTS - 1:
+            time.sleep(backoff)
+            backoff *= CONTAINER_POLL_BACKOFF
+    return "Container not ready in time"
+
+
 def publish_instagram_media(container_id: str) -> Tuple[Optional[str], Optional[str]]:
     """Publish the media container to Instagram."""
     try:
-        # Wait a moment for the container to be ready
-        time.sleep(2)
+        # Wait for the container to be ready
+        error = wait_for_instagram_container(container_id)
+        if error:
+            return None, error
 
-        response = requests.post(
+        response = get_http_session().post(
             f"{GRAPH_API_BASE}/{INSTAGRAM_BUSINESS_ACCOUNT_ID}/media_publish",
             params={
                 "creation_id": container_id,
@@ -430,7 +651,7 @@ def publish_instagram_media(container_id: str) -> Tuple[Optional[str], Optional[
 def generate_tal_caption(image_context: str, mood: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
     """Generate a TAL-style caption using the backend."""
     try:
-        response = requests.post(
+        response = get_http_session().post(
             f"{BACKEND_URL}/caption",
             json={
                 "image_context": image_context,
@@ -450,13 +671,18 @@ def generate_tal_caption(image_context: str, mood: Optional[str] = None) -> Tupl
         return None, str(e)
 
 
-def post_to_instagram(img: Image.Image, caption: str) -> Tuple[bool, str]:
-    """Full flow: Upload image → Create container → Publish to Instagram."""
+def post_to_instagram(image_path: str, caption: str, image_url: Optional[str] = None) -> Tuple[bool, str]:
+    """Full flow: Upload image → Create container → Publish to Instagram.
+
+    Pass image_url when the image is already hosted to skip the upload.
+    """
 
     # Step 1: Upload image to get public URL
-    image_url, error = upload_image_to_hosting(img)
-    if error:
-        return False, f"Image upload failed: {error}"
+    if image_url is None:
+        with Image.open(image_path) as img:
+            image_url, error = upload_image_to_hosting(img)
+        if error:
+            return False, f"Image upload failed: {error}"
 
     # Step 2: Create media container
     container_id, error = create_instagram_media_container(image_url, caption)
@@ -494,7 +720,7 @@ def get_linkedin_auth_url() -> str:
 def exchange_linkedin_code(code: str) -> Tuple[Optional[str], Optional[str]]:
     """Exchange authorization code for access token."""
     try:
-        response = requests.post(
+        response = get_http_session().post(
             LINKEDIN_TOKEN_URL,
             data={
                 "grant_type": "authorization_code",
@@ -519,7 +745,7 @@ def exchange_linkedin_code(code: str) -> Tuple[Optional[str], Optional[str]]:
 def get_linkedin_user_info(access_token: str) -> Tuple[Optional[dict], Optional[str]]:
     """Get LinkedIn user profile info."""
     try:
-        response = requests.get(
+        response = get_http_session().get(
             "https://api.linkedin.com/v2/userinfo",
             headers={"Authorization": f"Bearer {access_token}"},
             timeout=30,
@@ -533,7 +759,7 @@ def get_linkedin_user_info(access_token: str) -> Tuple[Optional[dict], Optional[
         return None, str(e)
 
 
-def upload_image_to_linkedin(access_token: str, user_urn: str, img: Image.Image) -> Tuple[Optional[str], Optional[str]]:
+def upload_image_to_linkedin(access_token: str, user_urn: str, image_path: str) -> Tuple[Optional[str], Optional[str]]:
     """Upload image to LinkedIn and get asset URN."""
     try:
         # Step 1: Register the upload
@@ -548,7 +774,7 @@ def upload_image_to_linkedin(access_token: str, user_urn: str, img: Image.Image)
             }
         }
 
-        register_response = requests.post(
+        register_response = get_http_session().post(
             f"{LINKEDIN_API_BASE}/assets?action=registerUpload",
             json=register_data,
             headers={
@@ -566,16 +792,9 @@ def upload_image_to_linkedin(access_token: str, user_urn: str, img: Image.Image)
         asset_urn = register_result["value"]["asset"]
 
         # Step 2: Upload the image binary
-        buffer = BytesIO()
-        if img.mode == "RGBA":
-            img = img.convert("RGB")
-        img.save(buffer, format="PNG")
-        buffer.seek(0)
-        image_bytes = buffer.read()
-
-        upload_response = requests.put(
+        upload_response = get_http_session().put(
             upload_url,
-            data=image_bytes,
+            data=Path(image_path).read_bytes(),  # Already a PNG; upload it as saved
             headers={
                 "Authorization": f"Bearer {access_token}",
                 "Content-Type": "image/png",
@@ -591,13 +810,13 @@ def upload_image_to_linkedin(access_token: str, user_urn: str, img: Image.Image)
         return None, str(e)
 
 
-def post_to_linkedin(access_token: str, user_urn: str, text: str, img: Optional[Image.Image] = None) -> Tuple[bool, str]:
+def post_to_linkedin(access_token: str, user_urn: str, text: str, image_path: Optional[str] = None) -> Tuple[bool, str]:
     """Post content to LinkedIn personal profile with native image upload."""
     try:
         # Upload image first if provided
         asset_urn = None
-        if img:
-            asset_urn, error = upload_image_to_linkedin(access_token, user_urn, img)
+        if image_path:
+            asset_urn, error = upload_image_to_linkedin(access_token, user_urn, image_path)
             if error:
                 return False, f"Image upload failed: {error}"
 
@@ -625,7 +844,7 @@ def post_to_linkedin(access_token: str, user_urn: str, text: str, img: Optional[
                 "media": asset_urn,
             }]
 
-        response = requests.post(
+        response = get_http_session().post(
             f"{LINKEDIN_API_BASE}/ugcPosts",
             json=post_data,
             headers={
@@ -644,6 +863,119 @@ def post_to_linkedin(access_token: str, user_urn: str, text: str, img: Optional[
         return False, str(e)
 
 
+# ============== Results UI ==============
+
+@st.fragment
+def show_results_grid(image_paths: list):
+    """Show generated images with download buttons; clicks rerun only this grid."""
+    cols = st.columns(len(image_paths))
+
+    for i, (col, img_path) in enumerate(zip(cols, image_paths)):
+        with col:
+            st.image(img_path, width="stretch")
+
+            # Download button (the saved file is already the PNG to hand out)
+            st.download_button(
+                f"⬇️ Download #{i+1}",
+                data=Path(img_path).read_bytes(),
+                file_name=f"tal_{st.session_state.run_id}_{i+1}.png",
+                mime="image/png",
+                width="stretch",
+            )
+
+
+@st.fragment
+def show_instagram_panel(image_paths: list):
+    """Instagram caption and posting controls; typing and clicks rerun only this panel."""
+    # Select which image to post
+    image_options = [f"Image #{i+1}" for i in range(len(image_paths))]
+    selected_image_idx = st.selectbox(
+        "Select image to post",
+        options=range(len(image_paths)),
+        format_func=lambda x: f"Image #{x+1}",
+    )
+
+    # Caption generation
+    st.markdown("**Caption**")
+
+    # Initialize caption in session state if not present
+    if "generated_caption" not in st.session_state:
+        st.session_state.generated_caption = ""
+
+    col_cap1, col_cap2 = st.columns([3, 1])
+
+    with col_cap1:
+        caption_context = st.text_input(
+            "What's happening in this image?",
+            placeholder="e.g., TAL chilling at a cafe, TAL crushing it at work...",
+            label_visibility="collapsed",
+        )
+
+    with col_cap2:
+        generate_caption_clicked = st.button(
+            "🎤 Generate Caption",
+            width="stretch",
+            help="Generate a TAL-style caption using AI",
+        )
+
+    if generate_caption_clicked and caption_context:
+        with st.spinner("TAL is cooking up a caption..."):
+            # Use the user's original request as context
+            context = caption_context or st.session_state.prompt_package.get("assumptions", ["TAL content"])[0]
+            generated, error = generate_tal_caption(context)
+
+            if generated:
+                st.session_state.generated_caption = generated
+                st.success("Caption generated!")
+            else:
+                st.error(f"Caption generation failed: {error}")
+
+    # Caption text area
+    default_caption = st.session_state.generated_caption or f"another day another chaos. you know how it is.\n\n#TAL #BangaloreTech #TechLife #ContentCreator #Vibes"
+    caption = st.text_area(
+        "Edit Caption",
+        value=default_caption,
+        height=120,
+        help="Edit the caption or generate a new one with TAL's voice",
+        label_visibility="collapsed",
+    )
+    # The LinkedIn section outside this fragment starts from the same caption
+    st.session_state.instagram_caption = caption
+
+    col_post1, col_post2 = st.columns([2, 1])
+
+    with col_post1:
+        post_clicked = st.button(
+            "📤 Post to Instagram",
+            type="primary",
+            width="stretch",
+            disabled=not caption.strip(),
+        )
+
+    with col_post2:
+        st.caption(f"Posting Image #{selected_image_idx + 1}")
+
+    if post_clicked:
+        with st.spinner("Posting to Instagram..."):
+            # Use the background upload if it succeeded; otherwise upload now
+            image_url = None
+            upload = st.session_state.get("hosted_uploads", [None] * len(image_paths))[selected_image_idx]
+            if upload is not None:
+                image_url, _ = upload.result()
+
+            success, message = post_to_instagram(
+                image_paths[selected_image_idx], caption.strip(), image_url=image_url
+            )
+
+            if success:
+                st.success(f"🎉 Maalik Aap Great Ho!")
+                st.balloons()
+                # Clear generated caption after successful post
+                st.session_state.generated_caption = ""
+            else:
+                st.error(f"❌ {message}")
+
+
 def main():
     """Main application entry point."""
 
@@ -696,7 +1028,7 @@ def main():
 
     with col2:
         models_ready = []
-        if google_api_key:
+        if google_api_key and genai is not None:
             models_ready.append("Nano Banana")
         if openai_api_key:
             models_ready.append("DALL-E")
@@ -796,7 +1128,7 @@ def main():
 
         with ref_col2:
             if uploaded_ref:
-                ref_image = Image.open(uploaded_ref).convert("RGB")
+                ref_image = load_reference_upload(uploaded_ref)
                 st.image(ref_image, caption="Reference", width=150)
                 use_reference = st.checkbox("Use this reference", value=True)
             else:
@@ -875,6 +1207,8 @@ def main():
                 st.error("TAL image not found!")
                 status.update(label="❌ Failed", state="error")
                 return
+            # Send a compact JPEG of the reference, encoded once, instead of the 1.5 MB PNG
+            tal_jpeg = load_tal_jpeg_bytes()
             st.success("TAL reference loaded")
 
             # Step 3: Generate images
@@ -885,38 +1219,52 @@ def main():
             errors = []
             progress = st.progress(0)
 
-            for i in range(num_images):
-                # Vary the prompt slightly for multiple images
-                variant_prompt = prompt_package["final_prompt"]
-                if i == 1:
-                    variant_prompt += " Close-up composition."
-                elif i == 2:
-                    variant_prompt += " Wide angle view."
-                elif i == 3:
-                    variant_prompt += " Dynamic side angle."
+            # Vary the prompt slightly for multiple images
+            variant_prompts = [
+                prompt_package["final_prompt"] + suffix
+                for suffix in PROMPT_VARIANT_SUFFIXES[:num_images]
+            ]
 
+            def generate_variant(variant_prompt: str):
                 if image_model == "Nano Banana":
-                    img, error = generate_image_with_nano_banana(
+                    return generate_image_with_nano_banana(
                         prompt=variant_prompt,
                         negative_prompt=prompt_package["negative_prompt"],
                         size=size,
-                        reference_image=tal_image,
+                        reference_image=tal_jpeg or tal_image,
                         additional_reference=ref_image if use_reference else None,
                     )
-                else:
-                    img, error = generate_image_with_openai(
-                        prompt=variant_prompt,
-                        size=size,
-                        reference_image=tal_image,
-                    )
+                return generate_image_with_openai(
+                    prompt=variant_prompt,
+                    size=size,
+                    reference_image=tal_image,
+                )
 
+            # Each image is an independent request; run them all at once. With
+            # INSTAGRAM_PREHOST, finished images start uploading while the rest render.
+            results = [None] * num_images
+            uploads = {}
+            prehost = INSTAGRAM_PREHOST and check_instagram_configured()
+            with ThreadPoolExecutor(max_workers=num_images) as executor:
+                futures = {
+                    executor.submit(generate_variant, variant_prompt): i
+                    for i, variant_prompt in enumerate(variant_prompts)
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    i = futures[future]
+                    results[i] = future.result()
+                    if prehost and results[i][0]:
+                        uploads[i] = get_upload_pool().submit(upload_image_to_hosting, results[i][0])
+                    progress.progress(done / num_images)
+
+            hosted_uploads = []
+            for i, (img, error) in enumerate(results):
                 if img:
                     generated_images.append(img)
+                    hosted_uploads.append(uploads.get(i))
                 else:
                     errors.append(f"Image {i+1}: {error}")
 
-                progress.progress((i + 1) / num_images)
-
             if not generated_images:
                 st.error(f"No images generated. Errors: {'; '.join(errors)}")
                 status.update(label="❌ Failed", state="error")
@@ -927,11 +1275,13 @@ def main():
             image_paths = save_outputs(run_id, generated_images, prompt_package)
             st.success(f"Saved {len(generated_images)} images")
 
-            # Store in session
-            st.session_state.generated_images = generated_images
+            # Store in session; images stay on disk and are referenced by path
             st.session_state.prompt_package = prompt_package
+            st.session_state.prompt_package_json = json.dumps(prompt_package, indent=2)
             st.session_state.run_id = run_id
             st.session_state.image_paths = image_paths
+            cancel_hosted_uploads()
+            st.session_state.hosted_uploads = hosted_uploads
 
             if errors:
                 st.warning(f"Some images failed: {'; '.join(errors)}")
@@ -939,28 +1289,11 @@ def main():
             status.update(label=f"✅ Generated {len(generated_images)} images!", state="complete")
 
     # Display results
-    if "generated_images" in st.session_state and st.session_state.generated_images:
+    if st.session_state.get("image_paths"):
         st.subheader(f"🖼️ Generated Images (Run: {st.session_state.run_id})")
 
-        images = st.session_state.generated_images
-        cols = st.columns(len(images))
-
-        for i, (col, img) in enumerate(zip(cols, images)):
-            with col:
-                st.image(img, width="stretch")
-
-                # Download button
-                buf = BytesIO()
-                img.save(buf, format="PNG")
-                buf.seek(0)
-
-                st.download_button(
-                    f"⬇️ Download #{i+1}",
-                    data=buf,
-                    file_name=f"tal_{st.session_state.run_id}_{i+1}.png",
-                    mime="image/png",
-                    width="stretch",
-                )
+        image_paths = st.session_state.image_paths
+        show_results_grid(image_paths)
 
         # Prompt details
         with st.expander("📝 Prompt Details"):
@@ -987,7 +1320,8 @@ def main():
 
         with col2:
             if st.button("🆕 New Request", width="stretch"):
-                for key in ["generated_images", "prompt_package", "run_id", "image_paths"]:
+                cancel_hosted_uploads()
+                for key in ["prompt_package", "prompt_package_json", "run_id", "image_paths", "hosted_uploads"]:
                     if key in st.session_state:
                         del st.session_state[key]
                 st.rerun()
@@ -996,7 +1330,7 @@ def main():
             # Download all as ZIP
             st.download_button(
                 "📦 Download JSON",
-                data=json.dumps(st.session_state.prompt_package, indent=2),
+                data=st.session_state.prompt_package_json,
                 file_name=f"tal_run_{st.session_state.run_id}.json",
                 mime="application/json",
                 width="stretch",
@@ -1009,84 +1343,7 @@ def main():
         if not check_instagram_configured():
             st.warning("Instagram not configured. Add INSTAGRAM_ACCESS_TOKEN and INSTAGRAM_BUSINESS_ACCOUNT_ID to .env")
         else:
-            # Select which image to post
-            image_options = [f"Image #{i+1}" for i in range(len(images))]
-            selected_image_idx = st.selectbox(
-                "Select image to post",
-                options=range(len(images)),
-                format_func=lambda x: f"Image #{x+1}",
-            )
-
-            # Caption generation
-            st.markdown("**Caption**")
-
-            # Initialize caption in session state if not present
-            if "generated_caption" not in st.session_state:
-                st.session_state.generated_caption = ""
-
-            col_cap1, col_cap2 = st.columns([3, 1])
-
-            with col_cap1:
-                caption_context = st.text_input(
-                    "What's happening in this image?",
-                    placeholder="e.g., TAL chilling at a cafe, TAL crushing it at work...",
-                    label_visibility="collapsed",
-                )
-
-            with col_cap2:
-                generate_caption_clicked = st.button(
-                    "🎤 Generate Caption",
-                    width="stretch",
-                    help="Generate a TAL-style caption using AI",
-                )
-
-            if generate_caption_clicked and caption_context:
-                with st.spinner("TAL is cooking up a caption..."):
-                    # Use the user's original request as context
-                    context = caption_context or st.session_state.prompt_package.get("assumptions", ["TAL content"])[0]
-                    generated, error = generate_tal_caption(context)
-
-                    if generated:
-                        st.session_state.generated_caption = generated
-                        st.success("Caption generated!")
-                    else:
-                        st.error(f"Caption generation failed: {error}")
-
-            # Caption text area
-            default_caption = st.session_state.generated_caption or f"another day another chaos. you know how it is.\n\n#TAL #BangaloreTech #TechLife #ContentCreator #Vibes"
-            caption = st.text_area(
-                "Edit Caption",
-                value=default_caption,
-                height=120,
-                help="Edit the caption or generate a new one with TAL's voice",
-                label_visibility="collapsed",
-            )
-
-            col_post1, col_post2 = st.columns([2, 1])
-
-            with col_post1:
-                post_clicked = st.button(
-                    "📤 Post to Instagram",
-                    type="primary",
-                    width="stretch",
-                    disabled=not caption.strip(),
-                )
-
-            with col_post2:
-                st.caption(f"Posting Image #{selected_image_idx + 1}")
-
-            if post_clicked:
-                with st.spinner("Posting to Instagram..."):
-                    selected_img = images[selected_image_idx]
-                    success, message = post_to_instagram(selected_img, caption.strip())
-
-                    if success:
-                        st.success(f"🎉 Maalik Aap Great Ho!")
-                        st.balloons()
-                        # Clear generated caption after successful post
-                        st.session_state.generated_caption = ""
-                    else:
-                        st.error(f"❌ {message}")
+            show_instagram_panel(image_paths)
 
         # LinkedIn Posting Section
         st.divider()
@@ -1146,7 +1403,7 @@ LINKEDIN_USER_URN={st.session_state.linkedin_urn}
                 # Select image for LinkedIn
                 li_image_idx = st.selectbox(
                     "Select image for LinkedIn",
-                    options=range(len(images)),
+                    options=range(len(image_paths)),
                     format_func=lambda x: f"Image #{x+1}",
                     key="linkedin_image_select",
                 )
@@ -1154,7 +1411,7 @@ LINKEDIN_USER_URN={st.session_state.linkedin_urn}
                 # LinkedIn caption
                 li_caption = st.text_area(
                     "LinkedIn Post",
-                    value=caption if 'caption' in dir() else "another day another chaos. you know how it is.",
+                    value=st.session_state.get("instagram_caption", "another day another chaos. you know how it is."),
                     height=120,
                     key="linkedin_caption",
                     help="Write your LinkedIn post content",
@@ -1184,13 +1441,11 @@ LINKEDIN_USER_URN={st.session_state.linkedin_urn}
 
                 if post_li_clicked:
                     with st.spinner("Posting to LinkedIn..."):
-                        selected_li_img = images[li_image_idx]
-
                         success, message = post_to_linkedin(
                             st.session_state.linkedin_token,
                             st.session_state.linkedin_urn,
                             li_caption.strip(),
-                            selected_li_img,  # Native image upload
+                            image_paths[li_image_idx],  # Native image upload
                         )
 
                         if success: